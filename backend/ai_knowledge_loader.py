@@ -3,43 +3,189 @@ AI Knowledge Loader
 Loads comprehensive production knowledge to enhance LLM context
 """
 
-import json
+import functools
+import mmap
+from itertools import islice
 import os
+import pickle
+import re
+import sys
+import threading
+from types import MappingProxyType
+
+import orjson
+
+# Static business rules prepended to every enhanced question - joined once at import
+_CRITICAL_RULES_TEXT = "\n".join([
+    "CRITICAL RULES:",
+    "1. Customer→Loan: customers.customer_id = account_holders.customer_id, account_holders.account_id = loan_od_working_registers.account_id",
+    "2. Product→Disbursement: loan_od_disbursements JOIN account_profiles ON (tenant_code AND account_id), then use product_code",
+    "3. Repayment→Account: loan_od_repayments JOIN loan_od_working_registers ON (tenant_code AND account_id) - REPAYMENTS are in loan_od_repayments, NOT loan_od_disbursements!",
+    "4. Amounts: Use magnitude columns (amount_magnitude, principal_magnitude, total_disbursed_magnitude)",
+    "5. Composite Keys: Many tables use (tenant_code, account_id)",
+    "6. Active records: Check is_closed=0 or status='ACTIVE'",
+    "7. CRITICAL: loan_od_disbursements = DISBURSEMENTS only, loan_od_repayments = REPAYMENTS/COLLECTIONS - NEVER confuse these!"
+])
+
+# Top-level knowledge sections consulted by this module; anything else in the file is dropped
+_KNOWLEDGE_SECTIONS = frozenset((
+    'table_relationships', 'aggregation_patterns', 'filter_patterns', 'common_queries', 'business_rules'
+))
+
+# Sections keyed by table name
+_TABLE_SECTIONS = ('table_relationships', 'aggregation_patterns', 'filter_patterns')
+
+# Keywords that drive pattern and guidance selection for a question
+_QUESTION_KEYWORDS = (
+    'product', 'disbursement', 'disburse', 'customer', 'outstanding', 'loan', 'amount',
+    'branch', 'collection', 'portfolio', 'par', 'npa', 'top', 'repayment'
+)
+
+# Zero-width lookahead so overlapping keywords are all reported in a single scan
+_KEYWORD_RE = re.compile('(?=(' + '|'.join(sorted(_QUESTION_KEYWORDS, key=len, reverse=True)) + '))')
+
+# A longer keyword match implies any keyword it contains (e.g. 'disbursement' -> 'disburse')
+_KEYWORD_IMPLIES = {kw: frozenset(k for k in _QUESTION_KEYWORDS if k in kw) for kw in _QUESTION_KEYWORDS}
+
+# Ordered dispatch from question keywords to a common_queries pattern type - first match wins
+_QUERY_PATTERN_RULES = (
+    ('product_disbursement', lambda kw: 'product' in kw and 'disburse' in kw),
+    ('customer_loan_amount', lambda kw: 'customer' in kw and bool(kw & {'outstanding', 'loan', 'amount'})),
+    ('branch_collection', lambda kw: 'branch' in kw and 'collection' in kw),
+    ('outstanding_report', lambda kw: bool(kw & {'outstanding', 'portfolio'})),
+    ('par_npa_report', lambda kw: bool(kw & {'par', 'npa'}))
+)
+
+
+def _scan_keywords(text_lower):
+    """Return the set of question keywords contained in text_lower (single regex pass)"""
+    found = set()
+    for match in _KEYWORD_RE.finditer(text_lower):
+        found |= _KEYWORD_IMPLIES[match.group(1)]
+    return found
+
+
+def _source_stamp(source_path):
+    """Size and nanosecond mtime of the knowledge file - any rewrite changes at least one"""
+    stat = os.stat(source_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _read_knowledge_cache(cache_path, source_stamp):
+    """Return the pickled knowledge snapshot, or None if it is missing, stale or unreadable"""
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('source') != source_stamp:
+            return None
+        return cached['knowledge']
+    except Exception:
+        return None
+
+
+def _write_knowledge_cache(cache_path, source_stamp, knowledge):
+    """Write the knowledge snapshot atomically; failures only cost the next start a JSON parse"""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'source': source_stamp, 'knowledge': knowledge}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"[KB] Could not write knowledge cache {cache_path}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _freeze(value):
+    """Recursively convert dicts to read-only mapping proxies and lists to tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
 
 class AIKnowledgeBase:
     """Comprehensive knowledge base for AI agent"""
     
-    def __init__(self):
+    __slots__ = ('knowledge', '_table_context', '_query_patterns', '_enhance_cached')
+    
+    def __init__(self, enhance_cache_size=1024):
         self.knowledge = None
+        self._table_context = {}
+        self._query_patterns = {}
+        # Enhanced questions are deterministic per question, so repeats are served from an LRU cache
+        self._enhance_cached = functools.lru_cache(maxsize=enhance_cache_size)(self._enhance_question)
         self.load_knowledge()
     
     def load_knowledge(self):
-        """Load comprehensive knowledge"""
+        """Load comprehensive knowledge (in place - use rebuild_knowledge_base() to reload a shared instance)"""
         knowledge_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'ai_comprehensive_knowledge.json')
         
-        if os.path.exists(knowledge_path):
-            with open(knowledge_path, 'r', encoding='utf-8') as f:
-                self.knowledge = json.load(f)
+        if os.path.exists(knowledge_path) and os.path.getsize(knowledge_path) > 0:
+            # Warm restarts unpickle the binary snapshot instead of re-parsing the JSON text
+            # The snapshot records the size and mtime of the JSON it came from (taken before parsing,
+            # so a rewrite during the parse makes the next start parse again)
+            cache_path = knowledge_path + '.pickle'
+            source_stamp = _source_stamp(knowledge_path)
+            self.knowledge = _read_knowledge_cache(cache_path, source_stamp)
+            if self.knowledge is None:
+                # Parse straight from the mapped file - orjson reads the buffer without a str decode
+                with open(knowledge_path, 'rb') as f:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buf:
+                        knowledge = orjson.loads(buf)
+                self.knowledge = {k: v for k, v in knowledge.items() if k in _KNOWLEDGE_SECTIONS}
+                _write_knowledge_cache(cache_path, source_stamp, self.knowledge)
         else:
             self.knowledge = {}
+        
+        # Normalize per-table sections to interned lowercase keys once, instead of per lookup
+        table_names = set()
+        for section in _TABLE_SECTIONS:
+            if section in self.knowledge:
+                self.knowledge[section] = {sys.intern(k.lower()): v for k, v in self.knowledge[section].items()}
+                table_names.update(self.knowledge[section])
+        
+        # Table context never changes after load, so render it once per known table
+        sections = [self.knowledge.get(section, {}) for section in _TABLE_SECTIONS]
+        self._table_context = {}
+        for table_lower in table_names:
+            context = self._build_table_context(table_lower, *sections)
+            if context:
+                self._table_context[table_lower] = context
+        
+        # Only the first example of each pattern type is ever shown, so format it up front
+        self._query_patterns = {
+            pattern_type: self._format_pattern(patterns[0])
+            for pattern_type, patterns in self.knowledge.get('common_queries', {}).items()
+            if patterns
+        }
+        
+        # The knowledge is shared by every request thread - make it read-only
+        self.knowledge = _freeze(self.knowledge)
+        
+        self._enhance_cached.cache_clear()
     
     def get_table_context(self, table_name):
         """Get context for a specific table"""
-        if not self.knowledge:
-            return ""
-        
-        # Normalize table name
-        table_lower = table_name.lower()
-        
+        # Callers usually pass already-lowercased names; only normalize on a miss
+        context = self._table_context.get(table_name)
+        if context is None:
+            context = self._table_context.get(table_name.lower(), "")
+        return context
+    
+    def _build_table_context(self, table_lower, relationships, agg_patterns, filter_patterns):
+        """Render the context string for a (lowercased) table name from the per-table sections"""
         context_parts = []
         
         # 1. Relationships
-        relationships = self.knowledge.get('table_relationships', {})
         if table_lower in relationships:
             rel = relationships[table_lower]
             joins_with = rel.get('joins_with', [])
             if joins_with:
-                context_parts.append(f"Commonly joins with: {', '.join(joins_with[:5])}")
+                context_parts.append(f"Commonly joins with: {', '.join(islice(joins_with, 5))}")
                 
                 # Show example join condition
                 conditions = rel.get('common_join_conditions', [])
@@ -48,79 +194,56 @@ class AIKnowledgeBase:
                     context_parts.append(f"Example: JOIN {ex.get('with')} ON {ex.get('condition', '')[:100]}")
         
         # 2. Aggregations
-        agg_patterns = self.knowledge.get('aggregation_patterns', {})
         if table_lower in agg_patterns:
             agg = agg_patterns[table_lower]
             
             sum_cols = agg.get('sum_columns', [])
             if sum_cols:
-                context_parts.append(f"Common SUM: {', '.join(sum_cols[:3])}")
+                context_parts.append(f"Common SUM: {', '.join(islice(sum_cols, 3))}")
         
         # 3. Filters
-        filter_patterns = self.knowledge.get('filter_patterns', {})
         if table_lower in filter_patterns:
             filt = filter_patterns[table_lower]
             
             eq_filters = filt.get('common_equality_filters', [])
             if eq_filters:
-                context_parts.append(f"Common filters: {', '.join(eq_filters[:3])}")
+                context_parts.append(f"Common filters: {', '.join(islice(eq_filters, 3))}")
         
         return " | ".join(context_parts) if context_parts else ""
     
-    def get_query_pattern(self, question_lower):
+    def get_query_pattern(self, question_lower, keywords=None):
         """Get relevant query pattern based on question"""
         if not self.knowledge:
             return None
         
-        common_queries = self.knowledge.get('common_queries', {})
+        if keywords is None:
+            keywords = _scan_keywords(question_lower)
         
         # Match question to pattern type
-        if 'product' in question_lower and ('disbursement' in question_lower or 'disburse' in question_lower):
-            patterns = common_queries.get('product_disbursement', [])
-            if patterns:
-                return self._format_pattern(patterns[0])
-        
-        if 'customer' in question_lower and ('outstanding' in question_lower or 'loan' in question_lower or 'amount' in question_lower):
-            patterns = common_queries.get('customer_loan_amount', [])
-            if patterns:
-                return self._format_pattern(patterns[0])
-        
-        if 'branch' in question_lower and 'collection' in question_lower:
-            patterns = common_queries.get('branch_collection', [])
-            if patterns:
-                return self._format_pattern(patterns[0])
-        
-        if 'outstanding' in question_lower or 'portfolio' in question_lower:
-            patterns = common_queries.get('outstanding_report', [])
-            if patterns:
-                return self._format_pattern(patterns[0])
-        
-        if 'par' in question_lower or 'npa' in question_lower:
-            patterns = common_queries.get('par_npa_report', [])
-            if patterns:
-                return self._format_pattern(patterns[0])
+        for pattern_type, matches in _QUERY_PATTERN_RULES:
+            if matches(keywords) and pattern_type in self._query_patterns:
+                return self._query_patterns[pattern_type]
         
         return None
     
     def _format_pattern(self, pattern):
         """Format a query pattern for LLM context"""
-        parts = []
+        get = pattern.get
+        parts = [f"Similar report: {get('report', 'N/A')}"]
         
-        parts.append(f"Similar report: {pattern.get('report', 'N/A')}")
-        
-        tables = pattern.get('tables', [])
+        tables = get('tables', [])
         if tables:
-            parts.append(f"Tables used: {', '.join(tables[:5])}")
+            parts.append(f"Tables used: {', '.join(islice(tables, 5))}")
         
-        joins = pattern.get('joins', [])
+        joins = get('joins', [])
         if joins:
             join_info = joins[0]
             parts.append(f"Example JOIN: {join_info.get('table')} ON {join_info.get('condition', '')[:100]}")
         
-        aggs = pattern.get('aggregations', [])
+        aggs = get('aggregations', [])
         if aggs:
-            agg_funcs = [a.get('function', '') for a in aggs[:3]]
-            parts.append(f"Aggregations: {', '.join(agg_funcs)}")
+            agg_funcs = ', '.join(a.get('function', '') for a in islice(aggs, 3))
+            parts.append(f"Aggregations: {agg_funcs}")
         
         return " | ".join(parts)
     
@@ -129,20 +252,7 @@ class AIKnowledgeBase:
         if not self.knowledge:
             return ""
         
-        rules = self.knowledge.get('business_rules', {})
-        
-        critical_rules = [
-            "CRITICAL RULES:",
-            "1. Customer→Loan: customers.customer_id = account_holders.customer_id, account_holders.account_id = loan_od_working_registers.account_id",
-            "2. Product→Disbursement: loan_od_disbursements JOIN account_profiles ON (tenant_code AND account_id), then use product_code",
-            "3. Repayment→Account: loan_od_repayments JOIN loan_od_working_registers ON (tenant_code AND account_id) - REPAYMENTS are in loan_od_repayments, NOT loan_od_disbursements!",
-            "4. Amounts: Use magnitude columns (amount_magnitude, principal_magnitude, total_disbursed_magnitude)",
-            "5. Composite Keys: Many tables use (tenant_code, account_id)",
-            "6. Active records: Check is_closed=0 or status='ACTIVE'",
-            "7. CRITICAL: loan_od_disbursements = DISBURSEMENTS only, loan_od_repayments = REPAYMENTS/COLLECTIONS - NEVER confuse these!"
-        ]
-        
-        return "\n".join(critical_rules)
+        return _CRITICAL_RULES_TEXT
     
     def enhance_question(self, question):
         """Enhance question with relevant context"""
@@ -150,42 +260,60 @@ class AIKnowledgeBase:
         if not question:
             return question or ""
         
+        return self._enhance_cached(question)
+    
+    def _enhance_question(self, question):
+        """Build the enhanced question (uncached - use enhance_question)"""
         question_lower = question.lower()
+        keywords = _scan_keywords(question_lower)
         
-        enhancements = []
+        # The empty entry puts a blank line between the question and its enhancements,
+        # so the whole prompt is produced by a single join
+        parts = [question, ""]
         
         # Add business rules context
         rules_context = self.get_business_rules_context()
         if rules_context:
-            enhancements.append(rules_context)
+            parts.append(rules_context)
         
         # Add pattern context if relevant
-        pattern = self.get_query_pattern(question_lower)
+        pattern = self.get_query_pattern(question_lower, keywords)
         if pattern:
-            enhancements.append(f"\nSimilar Production Pattern: {pattern}")
+            parts.append(f"\nSimilar Production Pattern: {pattern}")
         
         # Add specific guidance
-        if 'product' in question_lower and 'disbursement' in question_lower:
-            enhancements.append("\nGUIDANCE: Use loan_od_disbursements JOIN account_profiles ON (tenant_code AND account_id), GROUP BY product_code")
+        if 'product' in keywords and 'disbursement' in keywords:
+            parts.append("\nGUIDANCE: Use loan_od_disbursements JOIN account_profiles ON (tenant_code AND account_id), GROUP BY product_code")
         
-        if 'customer' in question_lower and ('top' in question_lower or 'loan' in question_lower):
-            enhancements.append("\nGUIDANCE: Use 3-table join: customer → account_holders → loan_od_working_registers")
+        if 'customer' in keywords and keywords & {'top', 'loan'}:
+            parts.append("\nGUIDANCE: Use 3-table join: customer → account_holders → loan_od_working_registers")
         
-        if 'repayment' in question_lower or ('collection' in question_lower and 'disbursement' not in question_lower):
-            enhancements.append("\nGUIDANCE: Use encoredb.loan_od_repayments for repayment/collection data, NOT loan_od_disbursements. Join with loan_od_working_registers ON (tenant_code AND account_id)")
+        if 'repayment' in keywords or ('collection' in keywords and 'disbursement' not in keywords):
+            parts.append("\nGUIDANCE: Use encoredb.loan_od_repayments for repayment/collection data, NOT loan_od_disbursements. Join with loan_od_working_registers ON (tenant_code AND account_id)")
         
-        if enhancements:
-            return question + "\n\n" + "\n".join(enhancements)
+        if len(parts) > 2:
+            return "\n".join(parts)
         
         return question
 
 # Global instance
 _kb_instance = None
+_kb_lock = threading.Lock()
 
 def get_knowledge_base():
-    """Get singleton knowledge base instance"""
+    """Get singleton knowledge base instance (thread-safe; the JSON is parsed once)"""
     global _kb_instance
     if _kb_instance is None:
-        _kb_instance = AIKnowledgeBase()
+        with _kb_lock:
+            if _kb_instance is None:
+                _kb_instance = AIKnowledgeBase()
     return _kb_instance
 
+
+def rebuild_knowledge_base():
+    """Build a fresh knowledge base and swap it in - requests keep the old one until it is fully built"""
+    global _kb_instance
+    kb = AIKnowledgeBase()
+    with _kb_lock:
+        _kb_instance = kb
+    return kb
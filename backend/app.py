@@ -5,25 +5,47 @@ Flask API with LangChain for Natural Language to SQL queries
 
 import sys
 import re
-from flask import Flask, request, jsonify, send_file
+import functools
+import gc
+import gzip
+import hashlib
+import logging
+import pickle
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import groupby
+from operator import itemgetter
+from flask import Flask, Response, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
 from urllib.parse import quote_plus
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import create_sql_agent, SQLDatabaseToolkit
 from langchain.agents.agent_types import AgentType
+from sqlalchemy import create_engine, text
 import mysql.connector
+import mysql.connector.pooling
 import pandas as pd
+import orjson
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Border, Side
 from openpyxl.utils import get_column_letter
 from datetime import datetime
 import tempfile
 
 # Import AI Knowledge Base
-from ai_knowledge_loader import get_knowledge_base
+from ai_knowledge_loader import get_knowledge_base, rebuild_knowledge_base
+from question_sql_store import QuestionSQLStore
+from semantic_cache import SemanticCache, canonical_question
+from ttl_cache import TTLCache
 
 # Fix Windows console encoding for emojis
 if sys.platform == 'win32':
@@ -34,7 +56,39 @@ if sys.platform == 'win32':
 
 load_dotenv()
 
+# Per-request trace output (agent steps, cache decisions) is logged at DEBUG - set LOG_LEVEL=DEBUG to see it
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(message)s')
+log = logging.getLogger('loanlytics')
+
+# Mirrors Flask's default JSON output: sorted keys, and dates/Decimal/UUID routed through
+# DefaultJSONProvider.default (OPT_PASSTHROUGH_DATETIME) so they serialize exactly as before
+_ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (C encoder) - used by jsonify for every API response"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=_ORJSON_OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = _ORJSON_OPTIONS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=option),
+            mimetype=self.mimetype
+        )
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)  # Enable CORS for frontend
 
 # Database configuration
@@ -43,9 +97,17 @@ DB_CONFIG = {
     'port': int(os.getenv('MYSQL_PORT', '3306')),
     'user': os.getenv('MYSQL_USER'),
     'password': os.getenv('MYSQL_PASSWORD'),
-    'database': os.getenv('MYSQL_DATABASE')
+    'database': os.getenv('MYSQL_DATABASE'),
+    # Protocol compression: fewer bytes for wide result sets when the database is across a slow link
+    'compress': os.getenv('MYSQL_COMPRESS', '0') == '1'
 }
 
+# Connections kept open per pool (request handlers and the LangChain engine each get one)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+
+# Sub-queries of one multi-part question run concurrently, each on its own pooled connection
+MAX_PARALLEL_QUERIES = int(os.getenv('MAX_PARALLEL_QUERIES', '4'))
+
 # Multiple schemas to query (comma-separated list)
 MYSQL_SCHEMAS = [s.strip() for s in os.getenv('MYSQL_SCHEMAS', '').split(',') if s.strip()]
 if not MYSQL_SCHEMAS and DB_CONFIG.get('database'):
@@ -63,7 +125,7 @@ if not MYSQL_SCHEMAS:
         )
         cursor = temp_conn.cursor()
         cursor.execute("SELECT SCHEMA_NAME FROM information_schema.SCHEMATA WHERE SCHEMA_NAME NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys') ORDER BY SCHEMA_NAME")
-        available_schemas = [row[0] for row in cursor.fetchall()]
+        available_schemas = [row[0] for row in cursor]
         temp_conn.close()
         
         # Prefer encoredb and financialForms if they exist
@@ -84,21 +146,302 @@ if not MYSQL_SCHEMAS:
         MYSQL_SCHEMAS = ['encoredb', 'financialForms']
         print(f"[CONFIG] Using default schemas: {', '.join(MYSQL_SCHEMAS)}")
 
+# Load the knowledge base before any worker fork and move it out of GC tracking,
+# so preloaded workers share its pages copy-on-write instead of each parsing a copy
+try:
+    get_knowledge_base()
+    gc.freeze()
+except Exception as kb_error:
+    print(f"[CONFIG] Knowledge base not preloaded: {kb_error}")
+
 # OpenAI configuration
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo-preview')
 
+# Semantic cache: reuse SQL from earlier questions with the same meaning
+# Off by default - it costs an embedding call per agent question, and near-identical wording can still differ in meaning
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE', '0') == '1'
+OPENAI_EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-small')
+_embeddings = None
+
+def embed_question(text):
+    """Embed a question with OpenAI (client created on first use)"""
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = OpenAIEmbeddings(model=OPENAI_EMBEDDING_MODEL, api_key=OPENAI_API_KEY)
+    return _embeddings.embed_query(text)
+
+# Words that flip the meaning of otherwise similar questions ("active" vs "closed" loans, "highest" vs "lowest")
+_SEMANTIC_QUALIFIER_RE = re.compile(
+    r'\b(active|open|closed|overdue|pending|npa|par|written|not|no|without|except|'
+    r'min|max|minimum|maximum|average|avg|highest|lowest|least|most|bottom|'
+    r'daily|weekly|monthly|quarterly|yearly|annual)\b'
+)
+
+def semantic_cache_intent(normalized_question):
+    """Keywords and qualifiers a cached question must share exactly before its SQL is reused"""
+    return frozenset(scan_question_keywords(normalized_question)) | frozenset(_SEMANTIC_QUALIFIER_RE.findall(normalized_question))
+
+semantic_cache = SemanticCache(
+    embed_question,
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95')),
+    ttl=int(os.getenv('SEMANTIC_CACHE_TTL', '3600')),
+    intent=semantic_cache_intent
+)
+
+# Agent SQL by canonical question, kept on disk so repeats skip the LLM even after a restart
+QUESTION_SQL_STORE_ENABLED = os.getenv('QUESTION_SQL_STORE', '1') == '1'
+question_sql_store = QuestionSQLStore(
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'question_sql.db'),
+    ttl=int(os.getenv('QUESTION_SQL_STORE_TTL', '604800'))
+)
+
+# Results of quick-pattern templates, keyed on (template id, params) - absorbs repeated dashboard questions
+template_result_cache = TTLCache(ttl=int(os.getenv('TEMPLATE_RESULT_TTL', '60')), max_entries=256)
+
+# Complete /api/query responses for exact repeat questions (e.g. dashboard polling) - kept briefly
+question_result_cache = TTLCache(ttl=int(os.getenv('QUESTION_RESULT_TTL', '30')), max_entries=512)
+
+# Results by SQL text, shared by /api/query and /api/execute - large results are never cached
+sql_result_cache = TTLCache(ttl=int(os.getenv('SQL_RESULT_TTL', '30')), max_entries=256)
+SQL_RESULT_CACHE_MAX_ROWS = 10000
+
+# Schema listings and autocomplete data rarely change - serve them from memory between refreshes
+schema_cache = TTLCache(ttl=int(os.getenv('SCHEMA_CACHE_TTL', '300')))
+# Serializes refills so concurrent cold requests (or warm-up) scan information_schema once
+_schema_refill_lock = threading.Lock()
+
 # Lazy initialization of database connection and agent
 langchain_db = None
 sql_agent = None
+_agent_lock = threading.Lock()
+_agent_ready = threading.Event()
+_agent_init_thread = None
+_agent_init_lock = threading.Lock()  # guards _agent_init_thread only, never held during initialization
+_agent_init_error = None
 
-def initialize_agent():
-    """Initialize LangChain SQL Agent with multiple schema support (lazy loading)"""
-    global langchain_db, sql_agent
+# Reflected LangChain schema metadata is cached here between restarts
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+# Tables of the connection database the agent reflects and lists (comma-separated); empty means all of them
+AGENT_TABLES = [t.strip() for t in os.getenv('AGENT_TABLES', '').split(',') if t.strip()]
+
+# Example rows the agent's schema tool adds per table - each costs a SELECT ... LIMIT per table described
+AGENT_SAMPLE_ROWS = int(os.getenv('AGENT_SAMPLE_ROWS', '0'))
+
+
+def schema_fingerprint(engine, database_name):
+    """Hash of every column definition in the connection database - changes on any DDL"""
+    digest = hashlib.sha1()
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT table_name, column_name, column_type, column_key
+            FROM information_schema.columns
+            WHERE table_schema = :schema
+            ORDER BY table_name, ordinal_position
+        """), {"schema": database_name})
+        for row in rows:
+            digest.update('|'.join(str(v) for v in row).encode('utf-8'))
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def load_sql_database(db_uri, database_name):
+    """Create the LangChain SQLDatabase, reusing pickled table reflection while the schema is unchanged"""
+    engine = create_engine(
+        db_uri,
+        pool_size=DB_POOL_SIZE,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        connect_args={'compress': DB_CONFIG['compress']}
+    )
+    target = f"{engine.url.host}:{engine.url.port}/{database_name}"
+    cache_path = os.path.join(DATA_DIR, f"langchain_schema_{hashlib.sha1(target.encode('utf-8')).hexdigest()[:12]}.pickle")
+    
+    fingerprint = None
+    try:
+        fingerprint = schema_fingerprint(engine, database_name)
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if cached.get('fingerprint') == fingerprint:
+                # Tables already present in the metadata are not reflected again
+                db = SQLDatabase(engine, metadata=cached['metadata'], include_tables=AGENT_TABLES or None, sample_rows_in_table_info=AGENT_SAMPLE_ROWS)
+                print(f"[INIT] Reused cached schema reflection ({len(cached['metadata'].tables)} tables)")
+                return db
+    except Exception as cache_error:
+        print(f"[INIT] Schema cache unavailable, reflecting: {cache_error}")
+    
+    # Reflection cost scales with the number of tables - AGENT_TABLES bounds it
+    db = SQLDatabase(engine, include_tables=AGENT_TABLES or None, sample_rows_in_table_info=AGENT_SAMPLE_ROWS)
+    
+    if fingerprint:
+        try:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'fingerprint': fingerprint, 'metadata': db._metadata}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception as cache_error:
+            print(f"[INIT] Could not cache schema reflection: {cache_error}")
+    
+    return db
+
+
+# Agent instructions - only the schema context varies between deployments
+_AGENT_PREFIX_TEMPLATE = """SQL agent trained on 274 production reports. Execute, return data only.
+{schema_context}
+KEY TABLES (by usage in production):
+- customer (financialForms/encoredb): 255 reports - URN, customer_id
+- branch_master (financialForms): 215 reports - branch hierarchy
+- loan_accounts (financialForms): 177 reports - account_number links
+- loan_od_working_registers (encoredb): 29 reports - current balances
+- loan_od_disbursements (encoredb): DISBURSEMENT data only (NOT repayments)
+- loan_od_repayments (encoredb): REPAYMENT data (collections, repayments)
+
+CRITICAL: TABLE DISTINCTIONS:
+- loan_od_disbursements = DISBURSEMENTS only (money given out)
+- loan_od_repayments = REPAYMENTS/COLLECTIONS (money received back)
+- NEVER use loan_od_disbursements for repayment/collection queries!
+
+CRITICAL JOINS (from production):
+{joins}
+
+PATTERNS (learned from 1315 SUM operations):
+- Amounts: SUM(amount_magnitude), SUM(principal_magnitude), SUM(total_disbursed_magnitude)
+- Repayment amounts: SUM(principal_magnitude) FROM loan_od_repayments
+- Composite keys: tenant_code + account_id
+- Active records: is_closed=0, status='ACTIVE'
+- Product grouping: GROUP BY product_code
+- Branch grouping: GROUP BY branch_id
+
+RULES:
+1. Execute immediately, return data
+2. "wise"/"by" → GROUP BY
+3. Use composite keys (tenant_code, account_id)
+4. CRITICAL: ALWAYS use schema.table_name format (e.g., encoredb.loan_od_working_registers, financialForms.loan_accounts)
+5. Common tables:
+   - encoredb.loan_od_working_registers (loan balances)
+   - encoredb.loan_od_disbursements (DISBURSEMENTS - money given out)
+   - encoredb.loan_od_repayments (REPAYMENTS/COLLECTIONS - money received)
+   - financialForms.loan_accounts (loan accounts)
+   - financialForms.customer (customers)
+6. NEVER use table names without schema prefix - queries will fail!
+7. For repayment/collection queries: ALWAYS use loan_od_repayments, NEVER loan_od_disbursements!
+"""
+
+
+def build_schema_context(schemas):
+    """Schema list section of the agent prefix"""
+    if schemas:
+        return f"""
+AVAILABLE SCHEMAS: {', '.join(schemas)}
+When querying tables, use schema.table_name format (e.g., encoredb.loan_od_working_registers, financialForms.customer)
+"""
+    return """
+SCHEMAS: Multiple schemas available. Use schema.table_name format when querying.
+Common schemas: encoredb, financialForms
+"""
+
+
+# Join rules by question intent - a question only gets the joins it can use (fewer prompt tokens)
+_PROMPT_JOIN_SLICES = (
+    ('customer', """Customer→Loan: customers.customer_id = account_holders.customer_id, 
+   account_holders.account_id = loan_od_working_registers.account_id"""),
+    ('disbursement', """Product→Disbursement: loan_od_disbursements JOIN account_profiles 
+   ON (tenant_code AND account_id), then product_code"""),
+    ('repayment', """Repayment→Account: loan_od_repayments JOIN loan_od_working_registers 
+   ON (tenant_code AND account_id) OR loan_od_repayments JOIN account_holders 
+   ON account_id, then to loan_od_working_registers"""),
+    ('branch', """Branch→Hub: branch_master.hub_id = hub_master.id""")
+)
+ALL_PROMPT_INTENTS = frozenset(intent for intent, _ in _PROMPT_JOIN_SLICES)
+
+# Question keywords (see _QUICK_KEYWORDS) that select each intent
+_PROMPT_INTENT_KEYWORDS = {
+    'customer': {'customer'},
+    'disbursement': {'disburs', 'product'},
+    'repayment': {'repayment', 'collection'},
+    'branch': {'branch', 'hub'}
+}
+
+
+def question_prompt_intents(question):
+    """Intents whose join rules the agent needs for a question; all of them when nothing matches"""
+    keywords = scan_question_keywords(question.lower())
+    intents = frozenset(intent for intent, words in _PROMPT_INTENT_KEYWORDS.items() if keywords & words)
+    return intents or ALL_PROMPT_INTENTS
+
+
+def build_agent_prefix(schemas, intents):
+    """Agent instructions with the schema list and the join rules for the given intents"""
+    joins = [text for intent, text in _PROMPT_JOIN_SLICES if intent in intents]
+    return _AGENT_PREFIX_TEMPLATE.format(
+        schema_context=build_schema_context(schemas),
+        joins="\n".join(f"{number}. {text}" for number, text in enumerate(joins, start=1))
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def build_sql_agent(db, schemas, model, intents):
+    """Build the LLM, toolkit and SQL agent once per (database, schemas, model, prompt intents)"""
+    llm = ChatOpenAI(
+        model=model,
+        temperature=0,
+        api_key=OPENAI_API_KEY
+    )
     
+    # Create toolkit (required for newer LangChain versions)
+    toolkit = SQLDatabaseToolkit(db=db, llm=llm)
+    
+    # Use OPENAI_FUNCTIONS agent - more reliable, no parsing errors
+    return create_sql_agent(
+        llm=llm,
+        toolkit=toolkit,
+        agent_type=AgentType.OPENAI_FUNCTIONS,
+        verbose=True,
+        max_iterations=8,
+        agent_executor_kwargs={"return_intermediate_steps": True},
+        prefix=build_agent_prefix(schemas, intents)
+    )
+
+
+def initialize_agent():
+    """Initialize LangChain SQL Agent with multiple schema support (lazy loading, thread-safe)"""
     if sql_agent is not None:
         return sql_agent
     
+    # Concurrent first requests wait for one initialization instead of each reflecting the schema
+    with _agent_lock:
+        if sql_agent is not None:
+            return sql_agent
+        agent = _initialize_agent()
+        _agent_ready.set()
+        return agent
+
+
+def start_agent_initialization():
+    """Initialize the agent on a background thread (no-op if already started or done)"""
+    global _agent_init_thread
+    
+    def run():
+        global _agent_init_error
+        try:
+            initialize_agent()
+            _agent_init_error = None
+        except Exception as e:
+            _agent_init_error = str(e)
+    
+    with _agent_init_lock:
+        if _agent_ready.is_set() or (_agent_init_thread is not None and _agent_init_thread.is_alive()):
+            return
+        _agent_init_thread = threading.Thread(target=run, name="agent-init", daemon=True)
+        _agent_init_thread.start()
+
+
+def _initialize_agent():
+    """Build the LangChain SQL Agent (call through initialize_agent)"""
+    global langchain_db, sql_agent
+    
     try:
         # Validate configuration - ensure all required values are not None
         host = DB_CONFIG.get('host') or ''
@@ -176,7 +519,7 @@ def initialize_agent():
         # Create LangChain SQL Database connection
         # Note: We connect to a database but can query other schemas using schema.table syntax
         try:
-            langchain_db = SQLDatabase.from_uri(db_uri, sample_rows_in_table_info=2)
+            langchain_db = load_sql_database(db_uri, database_name)
         except Exception as db_init_error:
             error_msg = str(db_init_error)
             print(f"[INIT ERROR] Database connection failed: {error_msg}")
@@ -188,111 +531,8 @@ def initialize_agent():
                 ) from db_init_error
             raise
         
-        # Create SQL Agent with LangChain
-        llm = ChatOpenAI(
-            model=OPENAI_MODEL,
-            temperature=0,
-            api_key=OPENAI_API_KEY
-        )
-        
-        # Add schema context to agent instructions
-        schema_info = ""
-        if MYSQL_SCHEMAS and len(MYSQL_SCHEMAS) > 1:
-            # Filter out None values and ensure all are strings
-            valid_schemas = [str(s).strip() for s in MYSQL_SCHEMAS if s and str(s).strip()]
-            if valid_schemas:
-                schema_info = f"""
-IMPORTANT - MULTIPLE SCHEMAS AVAILABLE:
-This MySQL database has {len(valid_schemas)} schemas: {', '.join(valid_schemas)}
-
-To query tables from different schemas, you MUST use the syntax: schema_name.table_name
-Examples:
-  - SELECT * FROM encoredb.loan_od_accounts LIMIT 10
-  - SELECT * FROM financialForms.loan_accounts LIMIT 10
-  - SELECT COUNT(*) FROM bi.loan_information
-
-To find tables across schemas, query information_schema:
-  SELECT table_schema, table_name 
-  FROM information_schema.tables 
-  WHERE table_schema IN ({', '.join([f"'{s}'" for s in valid_schemas])})
-  AND table_name LIKE '%your_search%'
-
-When answering questions about loans or any domain, ALWAYS search for relevant tables across ALL schemas first.
-"""
-        
-        # Create toolkit (required for newer LangChain versions)
-        toolkit = SQLDatabaseToolkit(db=langchain_db, llm=llm)
-        
-        # Build schema context for agent
-        schema_context = ""
-        if MYSQL_SCHEMAS:
-            schema_list = ', '.join(MYSQL_SCHEMAS)
-            schema_context = f"""
-AVAILABLE SCHEMAS: {schema_list}
-When querying tables, use schema.table_name format (e.g., encoredb.loan_od_working_registers, financialForms.customer)
-"""
-        else:
-            schema_context = """
-SCHEMAS: Multiple schemas available. Use schema.table_name format when querying.
-Common schemas: encoredb, financialForms
-"""
-        
-        # Use OPENAI_FUNCTIONS agent - more reliable, no parsing errors
-        sql_agent = create_sql_agent(
-            llm=llm,
-            toolkit=toolkit,
-            agent_type=AgentType.OPENAI_FUNCTIONS,
-            verbose=True,
-            max_iterations=8,
-            agent_executor_kwargs={"return_intermediate_steps": True},
-            prefix=f"""SQL agent trained on 274 production reports. Execute, return data only.
-{schema_context}
-KEY TABLES (by usage in production):
-- customer (financialForms/encoredb): 255 reports - URN, customer_id
-- branch_master (financialForms): 215 reports - branch hierarchy
-- loan_accounts (financialForms): 177 reports - account_number links
-- loan_od_working_registers (encoredb): 29 reports - current balances
-- loan_od_disbursements (encoredb): DISBURSEMENT data only (NOT repayments)
-- loan_od_repayments (encoredb): REPAYMENT data (collections, repayments)
-
-CRITICAL: TABLE DISTINCTIONS:
-- loan_od_disbursements = DISBURSEMENTS only (money given out)
-- loan_od_repayments = REPAYMENTS/COLLECTIONS (money received back)
-- NEVER use loan_od_disbursements for repayment/collection queries!
-
-CRITICAL JOINS (from production):
-1. Customer→Loan: customers.customer_id = account_holders.customer_id, 
-   account_holders.account_id = loan_od_working_registers.account_id
-2. Product→Disbursement: loan_od_disbursements JOIN account_profiles 
-   ON (tenant_code AND account_id), then product_code
-3. Repayment→Account: loan_od_repayments JOIN loan_od_working_registers 
-   ON (tenant_code AND account_id) OR loan_od_repayments JOIN account_holders 
-   ON account_id, then to loan_od_working_registers
-4. Branch→Hub: branch_master.hub_id = hub_master.id
-
-PATTERNS (learned from 1315 SUM operations):
-- Amounts: SUM(amount_magnitude), SUM(principal_magnitude), SUM(total_disbursed_magnitude)
-- Repayment amounts: SUM(principal_magnitude) FROM loan_od_repayments
-- Composite keys: tenant_code + account_id
-- Active records: is_closed=0, status='ACTIVE'
-- Product grouping: GROUP BY product_code
-- Branch grouping: GROUP BY branch_id
-
-RULES:
-1. Execute immediately, return data
-2. "wise"/"by" → GROUP BY
-3. Use composite keys (tenant_code, account_id)
-4. CRITICAL: ALWAYS use schema.table_name format (e.g., encoredb.loan_od_working_registers, financialForms.loan_accounts)
-5. Common tables:
-   - encoredb.loan_od_working_registers (loan balances)
-   - encoredb.loan_od_disbursements (DISBURSEMENTS - money given out)
-   - encoredb.loan_od_repayments (REPAYMENTS/COLLECTIONS - money received)
-   - financialForms.loan_accounts (loan accounts)
-   - financialForms.customer (customers)
-6. NEVER use table names without schema prefix - queries will fail!
-7. For repayment/collection queries: ALWAYS use loan_od_repayments, NEVER loan_od_disbursements!
-"""
-        )
+        # Agents are memoized per (database, schemas, model, intents) - re-initialization reuses the built agent
+        sql_agent = build_sql_agent(langchain_db, tuple(MYSQL_SCHEMAS), OPENAI_MODEL, ALL_PROMPT_INTENTS)
         
         print("[INIT] LangChain SQL Agent initialized successfully")
         return sql_agent
@@ -303,78 +543,51 @@ RULES:
         raise
 
 
+# Pooled MySQL connections for request handlers - avoids a TCP + auth handshake per query
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Create the connection pool on first use (opens DB_POOL_SIZE connections up front)"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name="loanlytics",
+                    pool_size=DB_POOL_SIZE,
+                    **DB_CONFIG
+                )
+                print(f"[INIT] MySQL connection pool ready ({DB_POOL_SIZE} connections)")
+    return _db_pool
+
+
 def get_db_connection():
-    """Create database connection"""
-    return mysql.connector.connect(**DB_CONFIG)
+    """Get a pooled database connection - close() returns it to the pool"""
+    try:
+        return get_db_pool().get_connection()
+    except mysql.connector.errors.PoolError:
+        # Pool exhausted under a burst: fall back to a dedicated connection rather than failing
+        print("[WARNING] Connection pool exhausted, opening a direct connection")
+        return mysql.connector.connect(**DB_CONFIG)
 
 
 def get_database_schema():
-    """Get database schema for all configured schemas (optimized for large databases)"""
+    """Get database schema for all configured schemas (optimized for large databases, cached for SCHEMA_CACHE_TTL)"""
+    cached = schema_cache.get('schema')
+    if cached is not None:
+        return cached
+    
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        all_tables = []
-        schema_info = ""
-        
-        # Use MYSQL_SCHEMAS if available, otherwise discover schemas
-        schemas_to_query = MYSQL_SCHEMAS if MYSQL_SCHEMAS else []
-        
-        if not schemas_to_query:
-            # Discover available schemas (excluding system schemas)
-            cursor.execute("""
-                SELECT DISTINCT table_schema 
-                FROM information_schema.tables 
-                WHERE table_schema NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys', '#innodb_redo', '#innodb_temp')
-                ORDER BY table_schema
-            """)
-            schemas_to_query = [row[0] for row in cursor.fetchall()]
-            if not schemas_to_query:
-                # Fallback: use current database
-                cursor.execute("SELECT DATABASE()")
-                db_result = cursor.fetchone()
-                if db_result and db_result[0]:
-                    schemas_to_query = [db_result[0]]
-        
-        # Query each schema
-        if schemas_to_query:
-            for schema_name in schemas_to_query:
-                try:
-                    cursor.execute(f"SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = '{schema_name}'")
-                    table_count = cursor.fetchone()[0]
-                    
-                    cursor.execute(f"SELECT table_name FROM information_schema.tables WHERE table_schema = '{schema_name}' ORDER BY table_name")
-                    tables = [f"{schema_name}.{row[0]}" for row in cursor.fetchall()]
-                    all_tables.extend(tables)
-                    
-                    schema_info += f"Schema: {schema_name} ({table_count} tables)\n"
-                    if table_count <= 20:
-                        schema_info += f"Tables: {', '.join([t.split('.')[1] for t in tables])}\n\n"
-                    else:
-                        schema_info += f"Tables (first 20): {', '.join([t.split('.')[1] for t in tables[:20]])}\n\n"
-                except Exception as schema_error:
-                    print(f"[WARNING] Could not query schema {schema_name}: {schema_error}")
-                    continue
-        else:
-            # Last resort: use current database
-            cursor.execute("SELECT DATABASE()")
-            db_result = cursor.fetchone()
-            db_name = db_result[0] if db_result and db_result[0] else 'unknown'
-            
-            cursor.execute("SHOW TABLES")
-            tables = [row[0] for row in cursor.fetchall()]
-            all_tables = tables
-            
-            schema_info = f"Database: {db_name}\n"
-            schema_info += f"Total tables: {len(tables)}\n\n"
-            if len(tables) <= 50:
-                schema_info += "Tables: " + ", ".join(tables)
-            else:
-                schema_info += "Tables (first 50): " + ", ".join(tables[:50])
-                schema_info += "\n\nNote: Large database. Query specific tables by name."
-        
-        conn.close()
-        return schema_info, all_tables
+        with _schema_refill_lock:
+            cached = schema_cache.get('schema')
+            if cached is not None:
+                return cached
+            with closing(get_db_connection()) as conn:
+                schema = _read_database_schema(conn.cursor())
+            schema_cache.set('schema', schema)
+        return schema
     
     except Exception as e:
         print(f"[ERROR] get_database_schema failed: {e}")
@@ -383,13 +596,89 @@ def get_database_schema():
         return str(e), []
 
 
-def quick_pattern_match(question):
-    """Fast template-based query generation for common patterns (learned from 274 production reports)"""
-    q = question.lower()
+def _read_database_schema(cursor):
+    """Build the schema summary and table list for get_database_schema"""
+    all_tables = []
+    schema_info = ""
+    
+    # Use MYSQL_SCHEMAS if available, otherwise discover schemas
+    schemas_to_query = MYSQL_SCHEMAS if MYSQL_SCHEMAS else []
+    
+    if not schemas_to_query:
+        # Discover available schemas (excluding system schemas)
+        cursor.execute("""
+            SELECT DISTINCT table_schema 
+            FROM information_schema.tables 
+            WHERE table_schema NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys', '#innodb_redo', '#innodb_temp')
+            ORDER BY table_schema
+        """)
+        schemas_to_query = [row[0] for row in cursor]
+        if not schemas_to_query:
+            # Fallback: use current database
+            cursor.execute("SELECT DATABASE()")
+            db_result = cursor.fetchone()
+            if db_result and db_result[0]:
+                schemas_to_query = [db_result[0]]
     
-    # Product-wise disbursement (21 production examples)
-    if 'product' in q and 'disburs' in q:
-        return """
+    # Query all schemas in one round trip
+    if schemas_to_query:
+        placeholders = ', '.join(['%s'] * len(schemas_to_query))
+        cursor.execute(f"""
+            SELECT table_schema, table_name
+            FROM information_schema.tables
+            WHERE table_schema IN ({placeholders})
+            ORDER BY table_schema, table_name
+        """, tuple(schemas_to_query))
+        
+        tables_by_schema = defaultdict(list)
+        for schema_name, table_name in cursor:
+            tables_by_schema[schema_name].append(table_name)
+        
+        for schema_name in schemas_to_query:
+            table_names = tables_by_schema.get(schema_name, [])
+            table_count = len(table_names)
+            all_tables.extend(f"{schema_name}.{table}" for table in table_names)
+            
+            schema_info += f"Schema: {schema_name} ({table_count} tables)\n"
+            if table_count <= 20:
+                schema_info += f"Tables: {', '.join(table_names)}\n\n"
+            else:
+                schema_info += f"Tables (first 20): {', '.join(table_names[:20])}\n\n"
+    else:
+        # Nothing visible and no connection database (DATABASE() was NULL above) - SHOW TABLES
+        # would only fail with "No database selected", so report the empty listing without a query
+        schema_info = "Database: unknown\nTotal tables: 0\n\n"
+    
+    return schema_info, all_tables
+
+
+# Substrings quick_pattern_match and the agent prompt intents look for in a question
+_QUICK_KEYWORDS = (
+    'product', 'disburs', 'disbursement', 'top', 'customer', 'loan', 'amount', 'count', 'number',
+    'account', 'first', 'show', 'list', 'outstanding', 'portfolio', 'total', 'sum', 'branch',
+    'collection', 'repayment', 'hub'
+)
+
+# Zero-width lookahead reports a keyword at every position in one scan; a keyword found there
+# implies every keyword it contains (e.g. 'account' -> 'count'), matching plain substring checks
+_QUICK_KEYWORD_RE = re.compile('(?=(' + '|'.join(sorted(_QUICK_KEYWORDS, key=len, reverse=True)) + '))')
+_QUICK_KEYWORD_IMPLIES = {kw: frozenset(k for k in _QUICK_KEYWORDS if k in kw) for kw in _QUICK_KEYWORDS}
+
+def scan_question_keywords(q):
+    """Set of _QUICK_KEYWORDS contained in the lowercased question (one regex pass)"""
+    keywords = set()
+    for match in _QUICK_KEYWORD_RE.finditer(q):
+        keywords |= _QUICK_KEYWORD_IMPLIES[match.group(1)]
+    return keywords
+
+
+_LIMIT_RES = {
+    'top': re.compile(r'top\s+(\d+)'),
+    'first': re.compile(r'first\s+(\d+)')
+}
+
+# Product-wise disbursement (21 production examples)
+_PRODUCT_DISBURSEMENT_SQL = """
 SELECT 
     ap.product_code,
     SUM(lod.amount_magnitude) AS total_disbursement_amount
@@ -400,17 +689,9 @@ GROUP BY ap.product_code
 ORDER BY total_disbursement_amount DESC
 LIMIT 100
 """
-    
-    # Top customers by loan amount (162 customer reports learned)
-    if ('top' in q or 'customer' in q) and ('loan' in q and 'amount' in q):
-        limit = 10
-        if 'top' in q:
-            import re
-            match = re.search(r'top\s+(\d+)', q)
-            if match:
-                limit = int(match.group(1))
-        
-        return f"""
+
+# Top customers by loan amount (162 customer reports learned)
+_TOP_CUSTOMERS_SQL = """
 SELECT 
     c.id,
     c.customer_id,
@@ -422,12 +703,11 @@ INNER JOIN encoredb.account_holders ah ON c.customer_id = ah.customer_id
 INNER JOIN encoredb.loan_od_working_registers lw ON ah.account_id = lw.account_id
 GROUP BY c.id, c.customer_id, c.first_name, c.last_name
 ORDER BY total_loan_amount DESC
-LIMIT {limit}
+LIMIT %s
 """
-    
-    # Product-wise loan count
-    if 'product' in q and ('count' in q or 'number' in q) and 'loan' in q:
-        return """
+
+# Product-wise loan count
+_PRODUCT_LOAN_COUNT_SQL = """
 SELECT 
     ap.product_code,
     COUNT(DISTINCT lw.account_id) AS loan_count
@@ -438,22 +718,9 @@ GROUP BY ap.product_code
 ORDER BY loan_count DESC
 LIMIT 100
 """
-    
-    # Loan accounts query (first N, show, list)
-    if ('loan' in q and 'account' in q) and ('first' in q or 'show' in q or 'list' in q or 'top' in q):
-        limit = 10
-        if 'first' in q:
-            import re
-            match = re.search(r'first\s+(\d+)', q)
-            if match:
-                limit = int(match.group(1))
-        elif 'top' in q:
-            import re
-            match = re.search(r'top\s+(\d+)', q)
-            if match:
-                limit = int(match.group(1))
-        
-        return f"""
+
+# Loan accounts query (first N, show, list)
+_LOAN_ACCOUNTS_SQL = """
 SELECT 
     la.id,
     la.account_number,
@@ -464,22 +731,20 @@ SELECT
 FROM financialForms.loan_accounts la
 WHERE la.loan_disbursement_date IS NOT NULL
 ORDER BY la.id DESC
-LIMIT {limit}
+LIMIT %s
 """
-    
-    # Outstanding/Portfolio (6 production examples)
-    if ('outstanding' in q or 'portfolio' in q) and ('total' in q or 'sum' in q):
-        return """
+
+# Outstanding/Portfolio (6 production examples)
+_OUTSTANDING_SQL = """
 SELECT 
     SUM(total_disbursed_magnitude) AS total_outstanding,
     COUNT(DISTINCT account_id) AS total_accounts
 FROM encoredb.loan_od_working_registers
 WHERE is_closed = 0
 """
-    
-    # Branch-wise collection (35 production examples)
-    if 'branch' in q and ('collection' in q or 'repayment' in q):
-        return """
+
+# Branch-wise collection (35 production examples)
+_BRANCH_COLLECTION_SQL = """
 SELECT 
     b.branch_name,
     b.branch_code,
@@ -494,10 +759,9 @@ GROUP BY b.branch_name, b.branch_code
 ORDER BY total_collection DESC
 LIMIT 100
 """
-    
-    # Repayment queries - use loan_od_repayments
-    if ('repayment' in q or 'collection' in q) and 'disbursement' not in q:
-        return """
+
+# Repayment queries - use loan_od_repayments
+_REPAYMENTS_SQL = """
 SELECT 
     lor.tenant_code,
     lor.account_id,
@@ -508,47 +772,231 @@ GROUP BY lor.tenant_code, lor.account_id
 ORDER BY total_repayment DESC
 LIMIT 100
 """
+
+# Headline metrics - single-row aggregates answered without the agent
+_ACTIVE_LOAN_ACCOUNTS_SQL = """
+SELECT COUNT(DISTINCT account_id) AS active_loan_accounts
+FROM encoredb.loan_od_working_registers
+WHERE is_closed = 0
+"""
+
+_TOTAL_LOAN_ACCOUNTS_SQL = """
+SELECT COUNT(DISTINCT account_id) AS total_loan_accounts
+FROM encoredb.loan_od_working_registers
+"""
+
+_TOTAL_CUSTOMERS_SQL = """
+SELECT COUNT(DISTINCT customer_id) AS total_customers
+FROM encoredb.customers
+"""
+
+# "how many ...", "number of ...", "what is the total number of ..."
+# (a bare "total loans" could mean an amount, so it is left to the agent)
+_METRIC_PREFIX = r'(?:what is (?:the )?)?(?:how many|(?:total )?(?:number|count) of)'
+_METRIC_SUFFIX = r'(?: are there| do we have)?'
+
+# Whole-question metric matches against canonical_question(question), checked before the keyword intents:
+# (metric id, pattern, sql)
+_METRICS = (
+    ('active_loan_accounts', re.compile(_METRIC_PREFIX + r' (?:active|open) loans?(?: accounts?)?' + _METRIC_SUFFIX), _ACTIVE_LOAN_ACCOUNTS_SQL),
+    ('total_loan_accounts', re.compile(_METRIC_PREFIX + r' loans?(?: accounts?)?' + _METRIC_SUFFIX), _TOTAL_LOAN_ACCOUNTS_SQL),
+    ('total_customers', re.compile(_METRIC_PREFIX + r' customers?' + _METRIC_SUFFIX), _TOTAL_CUSTOMERS_SQL)
+)
+
+# Ordered intents - first match wins:
+# (template id, matches(keywords), sql template, keywords that may set the LIMIT %s parameter)
+_QUICK_PATTERNS = (
+    ('product_disbursement', lambda kw: 'product' in kw and 'disburs' in kw, _PRODUCT_DISBURSEMENT_SQL, ()),
+    ('top_customers', lambda kw: bool(kw & {'top', 'customer'}) and 'loan' in kw and 'amount' in kw, _TOP_CUSTOMERS_SQL, ('top',)),
+    ('product_loan_count', lambda kw: 'product' in kw and bool(kw & {'count', 'number'}) and 'loan' in kw, _PRODUCT_LOAN_COUNT_SQL, ()),
+    ('loan_accounts', lambda kw: 'loan' in kw and 'account' in kw and bool(kw & {'first', 'show', 'list', 'top'}), _LOAN_ACCOUNTS_SQL, ('first', 'top')),
+    ('outstanding', lambda kw: bool(kw & {'outstanding', 'portfolio'}) and bool(kw & {'total', 'sum'}), _OUTSTANDING_SQL, ()),
+    ('branch_collection', lambda kw: 'branch' in kw and bool(kw & {'collection', 'repayment'}), _BRANCH_COLLECTION_SQL, ()),
+    ('repayments', lambda kw: bool(kw & {'repayment', 'collection'}) and 'disbursement' not in kw, _REPAYMENTS_SQL, ())
+)
+
+
+def quick_pattern_match(question):
+    """
+    Fast template-based query generation for common patterns (learned from 274 production reports)
+    Returns: (template_id, sql with %s placeholders, params tuple) or None
+    """
+    canonical = canonical_question(question)
+    for metric_id, pattern, sql in _METRICS:
+        if pattern.fullmatch(canonical):
+            return metric_id, sql, ()
+    
+    q = question.lower()
+    
+    keywords = scan_question_keywords(q)
+    
+    for template_id, matches, template, limit_keywords in _QUICK_PATTERNS:
+        if not matches(keywords):
+            continue
+        
+        if not limit_keywords:
+            return template_id, template, ()
+        
+        # "top 20" / "first 20" - only the first limit keyword present in the question is consulted
+        limit = 10
+        for limit_keyword in limit_keywords:
+            if limit_keyword in keywords:
+                match = _LIMIT_RES[limit_keyword].search(q)
+                if match:
+                    limit = int(match.group(1))
+                break
+        return template_id, template, (limit,)
     
     return None  # No pattern matched, use LLM
 
 
+# "How many loans? How many customers" / "... and how many ..."
+_QUESTION_PART_SPLIT_RE = re.compile(r'[?;]+|\s+(?:and|also|plus)\s+(?=how many|(?:the )?(?:total )?(?:number|count) of)', re.IGNORECASE)
+
+
+def decompose_metric_question(question):
+    """
+    Split a multi-part question whose every part is a registered metric.
+    Returns the distinct (metric_id, sql) parts in question order, or None if the question
+    has a single part or any part needs the agent.
+    """
+    parts = [part for part in _QUESTION_PART_SPLIT_RE.split(question) if part.strip()]
+    if len(parts) < 2:
+        return None
+    
+    metrics = {}
+    for part in parts:
+        canonical = canonical_question(part)
+        for metric_id, pattern, sql in _METRICS:
+            if pattern.fullmatch(canonical):
+                metrics.setdefault(metric_id, sql)
+                break
+        else:
+            return None
+    return list(metrics.items()) if len(metrics) > 1 else None
+
+
+_subquery_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_QUERIES, thread_name_prefix='subquery')
+
+
+def run_metric_parts(metric_parts):
+    """
+    Run single-row metric queries concurrently and merge them side by side into one row.
+    The SQL shown is the equivalent single statement (each metric CROSS JOINed as a derived table).
+    """
+    futures = [_subquery_executor.submit(run_quick_pattern, metric_id, sql, ()) for metric_id, sql in metric_parts]
+    columns, row = [], []
+    for future in futures:
+        part_columns, part_rows = future.result()
+        columns.extend(part_columns)
+        row.extend(part_rows[0] if part_rows else (None,) * len(part_columns))
+    
+    combined_sql = "SELECT *\nFROM " + "\nCROSS JOIN ".join(
+        f"({sql.strip()}) AS {metric_id}" for metric_id, sql in metric_parts
+    )
+    return combined_sql, columns, [tuple(row)]
+
+
+def tool_result(sql, columns, results, output, source):
+    """Shape a directly executed query like an agent result (single sql_db_query step)"""
+    return {
+        "output": output,
+        "intermediate_steps": [(type('obj', (), {'tool': 'sql_db_query', 'tool_input': sql})(), results)],
+        "columns": columns,
+        "source": source
+    }
+
+
+def render_template_sql(template, params):
+    """Template SQL with its (integer) parameters inlined, for display"""
+    return template % params if params else template
+
+
+def run_quick_pattern(template_id, template, params):
+    """Execute a quick-pattern template, serving repeats from the short-lived result cache"""
+    key = (template_id, params)
+    cached = template_result_cache.get(key)
+    if cached is None:
+        cached = execute_query(template, params or None)
+        template_result_cache.set(key, cached)
+    else:
+        log.debug("[CACHE] Template result hit: %s%s", template_id, params)
+    return cached
+
+
 def generate_sql_with_agent(question):
     """Use LangChain SQL Agent to generate SQL query"""
     try:
-        print(f"\n[DEBUG] Processing question: {question}")
-        print(f"[DEBUG] Available schemas: {', '.join(MYSQL_SCHEMAS) if MYSQL_SCHEMAS else 'default'}")
+        log.debug("\n[DEBUG] Processing question: %s", question)
+        log.debug("[DEBUG] Available schemas: %s", ', '.join(MYSQL_SCHEMAS) if MYSQL_SCHEMAS else 'default')
+        
+        # Several headline metrics in one question: run them in parallel, no LLM
+        metric_parts = decompose_metric_question(question)
+        if metric_parts:
+            log.debug("[DEBUG] Decomposed into metrics: %s", ', '.join(metric_id for metric_id, _ in metric_parts))
+            try:
+                combined_sql, columns, results = run_metric_parts(metric_parts)
+                return tool_result(combined_sql, columns, results, "Query executed successfully", "pattern")
+            except Exception as e:
+                print(f"[DEBUG] Metric queries failed: {e}, falling back to LLM")
         
         # Try fast pattern matching first
-        quick_sql = quick_pattern_match(question)
-        if quick_sql:
-            print("[DEBUG] Using quick pattern match")
+        quick_match = quick_pattern_match(question)
+        if quick_match:
+            log.debug("[DEBUG] Using quick pattern match")
             # Execute the template query
             try:
-                results = execute_query(quick_sql)
-                return {
-                    "output": "Query executed successfully",
-                    "intermediate_steps": [(type('obj', (), {'tool': 'sql_db_query', 'tool_input': quick_sql})(), results)]
-                }
+                columns, results = run_quick_pattern(*quick_match)
+                quick_sql = render_template_sql(quick_match[1], quick_match[2])
+                return tool_result(quick_sql, columns, results, "Query executed successfully", "pattern")
             except Exception as e:
                 print(f"[DEBUG] Quick pattern failed: {e}, falling back to LLM")
         
-        # Initialize agent
-        agent = initialize_agent()
+        # SQL the agent produced for this exact question before, possibly in an earlier run
+        if QUESTION_SQL_STORE_ENABLED:
+            try:
+                stored_sql = question_sql_store.get(canonical_question(question))
+            except Exception as e:
+                print(f"[DEBUG] Question SQL store unavailable: {e}")
+                stored_sql = None
+            if stored_sql:
+                try:
+                    columns, results = cached_execute_query(stored_sql)
+                    return tool_result(stored_sql, columns, results, "Query executed successfully (cached)", "cache")
+                except Exception as e:
+                    print(f"[DEBUG] Stored SQL failed: {e}, falling back to LLM")
+        
+        # Reuse SQL generated for an earlier question with the same meaning (fresh data, no LLM)
+        if SEMANTIC_CACHE_ENABLED:
+            cached_sql = semantic_cache.lookup(question)
+            if cached_sql:
+                try:
+                    columns, results = cached_execute_query(cached_sql)
+                    return tool_result(cached_sql, columns, results, "Query executed successfully (cached)", "cache")
+                except Exception as e:
+                    print(f"[DEBUG] Cached SQL failed: {e}, falling back to LLM")
+        
+        # Initialize agent, then pick the one whose prompt only carries the joins this question needs
+        initialize_agent()
+        intents = question_prompt_intents(question)
+        agent = build_sql_agent(langchain_db, tuple(MYSQL_SCHEMAS), OPENAI_MODEL, intents)
+        log.debug("[DEBUG] Prompt intents: %s", ', '.join(sorted(intents)))
         
         # Use AI Knowledge Base to enhance question with production patterns
         try:
             kb = get_knowledge_base()
             enhanced_question = kb.enhance_question(question) if question else question
-            print(f"[DEBUG] Enhanced question with knowledge base")
+            log.debug("[DEBUG] Enhanced question with knowledge base")
         except Exception as kb_error:
             print(f"[DEBUG] Knowledge base enhancement failed: {kb_error}, using original question")
             enhanced_question = question
         
         # Use the agent to generate and run the query
         result = agent.invoke({"input": enhanced_question})
+        result["source"] = "agent"
         
-        print(f"[DEBUG] Agent result type: {type(result)}")
-        print(f"[DEBUG] Agent output: {result.get('output', 'No output')[:200]}")
+        log.debug("[DEBUG] Agent result type: %s", type(result))
+        log.debug("[DEBUG] Agent output: %.200s", result.get('output', 'No output'))
         
         return result
     
@@ -559,6 +1007,17 @@ def generate_sql_with_agent(question):
         return {"error": str(e)}
 
 
+# Data modification and schema change keywords, folded into one pattern so a query is scanned once
+# Note: DESC, DESCRIBE, EXPLAIN, SHOW are read-only and safe, so not blocked
+_DANGEROUS_SQL_RE = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|DROP|TRUNCATE|ALTER|CREATE|GRANT|REVOKE|EXEC|EXECUTE'
+    r'|CALL|MERGE|REPLACE|LOAD|COPY|LOCK|UNLOCK)\b',
+    re.IGNORECASE
+)
+_SELECT_PREFIX_RE = re.compile(r'\s*SELECT', re.IGNORECASE)
+_UNION_RE = re.compile(r'UNION', re.IGNORECASE)
+
+
 def validate_sql_query(sql):
     """
     Validate SQL query - only allow SELECT statements
@@ -567,100 +1026,314 @@ def validate_sql_query(sql):
     if not sql or not sql.strip():
         return False, "Query cannot be empty"
     
-    sql_upper = sql.strip().upper()
-    
-    # Block dangerous operations (data modification and schema changes)
-    dangerous_keywords = [
-        'INSERT', 'UPDATE', 'DELETE', 'DROP', 'TRUNCATE', 
-        'ALTER', 'CREATE', 'GRANT', 'REVOKE', 'EXEC', 'EXECUTE',
-        'CALL', 'MERGE', 'REPLACE', 'LOAD', 'COPY', 'LOCK',
-        'UNLOCK'
-    ]
-    
-    # Note: DESC, DESCRIBE, EXPLAIN, SHOW are read-only and safe, so not blocked
+    sql_stripped = sql.strip()
     
-    # Check for dangerous keywords (not in comments)
-    for keyword in dangerous_keywords:
-        # Simple check - keyword not part of a word and not in comments
-        pattern = r'\b' + keyword + r'\b'
-        if re.search(pattern, sql_upper):
-            return False, f"Operation '{keyword}' is not allowed. Only SELECT queries are permitted."
+    # Check for dangerous keywords (whole words only)
+    match = _DANGEROUS_SQL_RE.search(sql_stripped)
+    if match:
+        return False, f"Operation '{match.group(1).upper()}' is not allowed. Only SELECT queries are permitted."
     
     # Must start with SELECT
-    if not sql_upper.startswith('SELECT'):
+    if not _SELECT_PREFIX_RE.match(sql_stripped):
         return False, "Only SELECT queries are allowed. Query must start with SELECT."
     
     # Block semicolon injection attempts (multiple statements)
-    if sql_upper.count(';') > 1 or (sql_upper.count(';') == 1 and not sql_upper.rstrip().endswith(';')):
+    semicolons = sql_stripped.count(';')
+    if semicolons > 1 or (semicolons == 1 and not sql_stripped.endswith(';')):
         return False, "Multiple statements are not allowed. Only single SELECT queries are permitted."
     
     # Additional safety: Check for UNION with dangerous operations
-    if 'UNION' in sql_upper:
+    if _UNION_RE.search(sql_stripped):
         # Allow UNION SELECT but validate it's safe
-        union_parts = sql_upper.split('UNION')
-        for part in union_parts:
-            part_stripped = part.strip()
-            if part_stripped and not part_stripped.startswith('SELECT'):
+        for part in _UNION_RE.split(sql_stripped):
+            if part.strip() and not _SELECT_PREFIX_RE.match(part):
                 return False, "UNION queries must only contain SELECT statements."
     
     return True, None
 
 
+# Common tables that need schema prefixes
+_TABLE_SCHEMA_MAP = {
+    'loan_od_working_registers': 'encoredb',
+    'loan_od_disbursements': 'encoredb',
+    'account_profiles': 'encoredb',
+    'account_holders': 'encoredb',
+    'customers': 'encoredb',
+    'loan_accounts': 'financialForms',
+    'customer': 'financialForms',
+    'branch_master': 'financialForms',
+    'loan_repayment_details': 'financialForms'
+}
+
+# FROM/JOIN/UPDATE followed by a bare known table name (schema-qualified names never match)
+_UNPREFIXED_TABLE_RE = re.compile(
+    r'\b(FROM|JOIN|UPDATE)\s+(' + '|'.join(sorted(_TABLE_SCHEMA_MAP, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+_SCHEMA_PREFIX_RE = re.compile(r'(?:FROM|JOIN) (?:encoredb|financialForms)\.', re.IGNORECASE)
+
+
+def _add_schema_prefix(match):
+    table = match.group(2).lower()
+    return f"{match.group(1)} {_TABLE_SCHEMA_MAP[table]}.{table}"
+
+
+@functools.lru_cache(maxsize=1024)
 def fix_sql_schema_prefixes(sql):
-    """Add schema prefixes to table names if missing"""
-    # Common tables that need schema prefixes
-    table_schema_map = {
-        'loan_od_working_registers': 'encoredb',
-        'loan_od_disbursements': 'encoredb',
-        'account_profiles': 'encoredb',
-        'account_holders': 'encoredb',
-        'customers': 'encoredb',
-        'loan_accounts': 'financialForms',
-        'customer': 'financialForms',
-        'branch_master': 'financialForms',
-        'loan_repayment_details': 'financialForms'
-    }
+    """Add schema prefixes to table names if missing (pure string transform - memoized)"""
+    # Queries that already qualify our known schemas are left alone (bare names may be CTEs)
+    if _SCHEMA_PREFIX_RE.search(sql):
+        return sql
     
-    sql_upper = sql.upper()
-    fixed_sql = sql
-    
-    # Check if query already has schema prefixes for our known schemas
-    has_schema_prefix = any(
-        f'FROM {schema}.' in sql_upper or f'JOIN {schema}.' in sql_upper 
-        for schema in ['ENCOREDB', 'FINANCIALFORMS']
-    )
-    
-    # Only fix if schema prefixes are missing
-    if not has_schema_prefix:
-        for table, schema in table_schema_map.items():
-            # Pattern: FROM table_name or JOIN table_name (but not schema.table_name)
-            # Match: FROM table_name, JOIN table_name, UPDATE table_name
-            # Don't match if already has schema prefix
-            pattern = r'\b(FROM|JOIN|UPDATE)\s+(?!' + schema + r'\.)' + table + r'\b'
-            replacement = r'\1 ' + schema + '.' + table
-            fixed_sql = re.sub(pattern, replacement, fixed_sql, flags=re.IGNORECASE)
-    
-    return fixed_sql
+    # One pass rewrites every bare known table
+    return _UNPREFIXED_TABLE_RE.sub(_add_schema_prefix, sql)
 
 
-def execute_query(sql):
-    """Execute SQL query and return results"""
+def execute_query(sql, params=None):
+    """Execute SQL query (with optional %s parameters) and return (column names, row tuples)"""
     try:
         # Fix schema prefixes if missing
         sql = fix_sql_schema_prefixes(sql)
         
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(sql)
-        results = cursor.fetchall()
-        conn.close()
+        with closing(get_db_connection()) as conn:
+            # Plain tuples plus one list of column names - no per-row dict
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            columns = list(cursor.column_names)
         
-        return results
+        return columns, rows
     
     except Exception as e:
         raise Exception(f"Query execution failed: {str(e)}")
 
 
+def cached_json_body(cache_key, build_payload):
+    """Return (body, gzipped body, etag) for a payload cached in schema_cache, building it once on a miss"""
+    entry = schema_cache.get(f"{cache_key}:response")
+    if entry is not None:
+        return entry
+    
+    with _schema_refill_lock:
+        entry = schema_cache.get(f"{cache_key}:response")
+        if entry is None:
+            body = orjson.dumps(build_payload(), default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+            entry = (body, gzip.compress(body), hashlib.sha1(body).hexdigest())
+            schema_cache.set(f"{cache_key}:response", entry)
+    return entry
+
+
+def cached_json_response(cache_key, build_payload):
+    """
+    Serve a rarely-changing JSON payload from schema_cache as pre-encoded bytes.
+    The body is serialized, gzipped and hashed once per refill; clients revalidate with
+    If-None-Match and get a bodiless 304 while the payload is unchanged.
+    """
+    body, gzipped, etag = cached_json_body(cache_key, build_payload)
+    
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    elif request.accept_encodings['gzip']:
+        response = Response(gzipped, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(body, mimetype='application/json')
+    
+    # Weak: the gzip and identity bodies are the same content in different encodings
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+STREAM_BATCH_SIZE = 1000
+STREAM_QUEUE_DEPTH = 4  # fetched batches buffered ahead of the encoder
+
+
+def stream_query_response(sql, cache_key=None):
+    """
+    Execute a query on an unbuffered cursor and stream the JSON response batch by batch.
+    A reader thread fetches batches into a bounded queue while the response generator encodes
+    them, so database reads overlap JSON encoding and at most STREAM_QUEUE_DEPTH batches are held.
+    Same shape as a buffered response; "success" comes last so a failure part-way through
+    still ends in valid JSON. With cache_key, a complete result of up to SQL_RESULT_CACHE_MAX_ROWS
+    rows is stored in sql_result_cache.
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql)
+        columns = list(cursor.column_names)
+    except Exception:
+        conn.close()
+        raise
+    
+    batches = queue.Queue(maxsize=STREAM_QUEUE_DEPTH)
+    stop = threading.Event()
+    
+    def put(item):
+        """Queue an item unless the response was abandoned; False if it was"""
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def read_batches():
+        try:
+            # Stop checked before every fetch, so an abandoned response reads no further rows
+            while not stop.is_set():
+                batch = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not batch:
+                    put(None)  # end of result
+                    return
+                if not put(batch):
+                    return
+        except Exception as e:
+            put(e)
+    
+    def next_batch():
+        """Next queued item; raises if the reader died without queueing one (no endless wait)"""
+        while True:
+            try:
+                return batches.get(timeout=0.5)
+            except queue.Empty:
+                if not reader.is_alive() and batches.empty():
+                    raise RuntimeError("result reader stopped unexpectedly")
+    
+    reader = threading.Thread(target=read_batches, name="stream-reader", daemon=True)
+    completed = False
+    released = False
+    
+    def release():
+        """Stop the reader and return the connection - runs once, from the generator or on response close"""
+        nonlocal released
+        if released:
+            return
+        released = True
+        # The reader owns the cursor until it exits - only then touch the connection
+        stop.set()
+        if reader.ident is not None:
+            reader.join()
+        if not completed:
+            # Unread rows would break the connection's next use - drop the socket, the pool reconnects it
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def generate():
+        nonlocal completed
+        count = 0
+        collected = [] if cache_key is not None else None
+        reader.start()
+        try:
+            yield b'{"sql":' + orjson.dumps(sql) + b',"columns":' + orjson.dumps(columns) + b',"results":['
+            while True:
+                batch = next_batch()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                rows = orjson.dumps(batch, default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+                yield (b',' if count else b'') + rows[1:-1]
+                count += len(batch)
+                if collected is not None:
+                    collected.extend(batch)
+                    if len(collected) > SQL_RESULT_CACHE_MAX_ROWS:
+                        collected = None
+            completed = True
+            if collected is not None:
+                sql_result_cache.set(cache_key, (columns, collected))
+            yield b'],"count":' + str(count).encode() + b',"success":true}'
+        except Exception as e:
+            # The status is already 200 - the closing record tells the client the rows are incomplete
+            print(f"[API] Streaming failed after {count} rows: {e}")
+            yield (b'],"count":' + str(count).encode() + b',"success":false,"error":'
+                   + orjson.dumps(f"Query execution failed: {str(e)}") + b'}')
+        finally:
+            release()
+    
+    response = Response(generate(), mimetype='application/json')
+    # A client that disconnects before the body is iterated never runs generate()'s finally
+    response.call_on_close(release)
+    return response
+
+
+# Pre-warm connections, knowledge base and agent in the background so the first question doesn't pay for them
+WARMUP_ENABLED = os.getenv('WARMUP', '0') == '1'
+_warm_up_started = False
+_warm_up_lock = threading.Lock()
+
+
+def prefetch_schema_metadata():
+    """Fill the table listing and autocomplete caches before the first page load asks for them"""
+    get_database_schema()
+    cached_json_body('autocomplete', _autocomplete_payload)
+
+
+def warm_up():
+    """Open the connection pool, prefetch schema metadata, load the knowledge base and build the agent, logging each cost"""
+    steps = (
+        ("Connection pool", get_db_pool),
+        ("Schema metadata", prefetch_schema_metadata),
+        ("Knowledge base", get_knowledge_base),
+        ("SQL agent", initialize_agent)
+    )
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+            log.info("[WARMUP] %s ready in %.2fs", name, time.perf_counter() - started)
+        except Exception as e:
+            log.warning("[WARMUP] %s failed after %.2fs: %s", name, time.perf_counter() - started, e)
+
+
+def start_warm_up():
+    """Run warm_up on a daemon thread, once per process"""
+    global _warm_up_started
+    with _warm_up_lock:
+        if _warm_up_started:
+            return
+        _warm_up_started = True
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.before_request
+def warm_up_on_first_request():
+    """
+    Under a WSGI server, warm each worker when it sees its first request (the frontend's
+    health check on page load) - warming at import would share sockets across preforked workers
+    """
+    if WARMUP_ENABLED and not _warm_up_started:
+        start_warm_up()
+
+
+def sql_cache_key(sql):
+    """Compact fixed-size key for a SQL string"""
+    return hashlib.blake2b(sql.strip().encode('utf-8'), digest_size=16).digest()
+
+
+def cached_execute_query(sql):
+    """execute_query, serving identical SQL from the short-lived result cache"""
+    key = sql_cache_key(fix_sql_schema_prefixes(sql))
+    cached = sql_result_cache.get(key)
+    if cached is not None:
+        log.debug("[CACHE] SQL result hit")
+        return cached
+    
+    columns, rows = execute_query(sql)
+    if len(rows) <= SQL_RESULT_CACHE_MAX_ROWS:
+        sql_result_cache.set(key, (columns, rows))
+    return columns, rows
+
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
@@ -686,23 +1359,43 @@ def diagnose():
             "tables": []
         }
         
-        # Try to get tables
-        try:
-            _, tables = get_database_schema()
+        # ?force=1 runs the full (slow) check: live introspection and synchronous agent initialization
+        if request.args.get('force') == '1':
+            try:
+                _, tables = get_database_schema()
+                diagnosis["tables"] = {
+                    "count": len(tables),
+                    "first_10": tables[:10] if tables else []
+                }
+            except Exception as e:
+                diagnosis["tables"] = {"error": str(e)}
+            
+            if sql_agent is None:
+                try:
+                    initialize_agent()
+                    diagnosis["agent_status"] = "initialized_successfully"
+                except Exception as e:
+                    diagnosis["agent_status"] = f"initialization_failed: {str(e)}"
+            
+            return jsonify(diagnosis)
+        
+        # Default: report only what is already known - never blocks on the database or the LLM
+        cached_schema = schema_cache.get('schema')
+        if cached_schema is not None:
+            tables = cached_schema[1]
             diagnosis["tables"] = {
                 "count": len(tables),
-                "first_10": tables[:10] if tables else []
+                "first_10": tables[:10]
             }
-        except Exception as e:
-            diagnosis["tables"] = {"error": str(e)}
+        else:
+            diagnosis["tables"] = {"status": "not_cached"}
         
-        # Try to initialize agent if not already done
         if sql_agent is None:
-            try:
-                agent = initialize_agent()
-                diagnosis["agent_status"] = "initialized_successfully"
-            except Exception as e:
-                diagnosis["agent_status"] = f"initialization_failed: {str(e)}"
+            if _agent_init_error and not (_agent_init_thread and _agent_init_thread.is_alive()):
+                diagnosis["agent_status"] = f"initialization_failed: {_agent_init_error}"
+            else:
+                start_agent_initialization()
+                diagnosis["agent_status"] = "initializing"
         
         return jsonify(diagnosis)
     except Exception as e:
@@ -717,7 +1410,14 @@ def get_tables():
     """Get list of all database tables"""
     try:
         _, tables = get_database_schema()
-        return jsonify({
+        if not tables:
+            # Introspection failed or found nothing - don't cache the empty listing
+            return jsonify({
+                "success": True,
+                "tables": tables,
+                "count": 0
+            })
+        return cached_json_response('tables', lambda: {
             "success": True,
             "tables": tables,
             "count": len(tables)
@@ -733,11 +1433,20 @@ def get_tables():
 def get_table_info(table_name):
     """Get columns for a specific table"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(f"SHOW COLUMNS FROM {table_name}")
-        columns = [{"name": row[0], "type": row[1]} for row in cursor.fetchall()]
-        conn.close()
+        # Bound parameters instead of interpolating the URL segment into SQL
+        schema_name, _, bare_table = table_name.rpartition('.')
+        with closing(get_db_connection()) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT column_name, column_type
+                FROM information_schema.columns
+                WHERE table_schema = COALESCE(%s, DATABASE()) AND table_name = %s
+                ORDER BY ordinal_position
+            """, (schema_name or None, bare_table))
+            columns = [{"name": row[0], "type": row[1]} for row in cursor]
+        
+        if not columns:
+            raise ValueError(f"Table '{table_name}' doesn't exist")
         
         return jsonify({
             "success": True,
@@ -755,80 +1464,127 @@ def get_table_info(table_name):
 def get_autocomplete_data():
     """Get all tables and columns for autocomplete suggestions"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        autocomplete_data = {
-            "tables": [],
-            "columns": {},
-            "schemas": MYSQL_SCHEMAS if MYSQL_SCHEMAS else []
+        return cached_json_response('autocomplete', _autocomplete_payload)
+    except Exception as e:
+        print(f"[ERROR] Autocomplete data fetch failed: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "data": {"tables": [], "columns": {}, "schemas": []}
+        }), 500
+
+
+def _autocomplete_payload():
+    """Build the /api/autocomplete response body"""
+    with closing(get_db_connection()) as conn:
+        return {
+            "success": True,
+            "data": _read_autocomplete_data(conn.cursor())
         }
-        
-        # Get all tables with their schemas
-        schemas_to_query = MYSQL_SCHEMAS if MYSQL_SCHEMAS else []
-        
-        if not schemas_to_query:
-            # Discover schemas
+
+
+def _read_autocomplete_data(cursor):
+    """Collect tables and their columns for autocomplete"""
+    autocomplete_data = {
+        "tables": [],
+        "columns": {},
+        "schemas": MYSQL_SCHEMAS if MYSQL_SCHEMAS else []
+    }
+    
+    # Get all tables with their schemas - at most 5 schemas for performance
+    schemas_to_query = MYSQL_SCHEMAS[:5]
+    
+    if not schemas_to_query:
+        # Discover schemas
+        cursor.execute("""
+            SELECT DISTINCT table_schema 
+            FROM information_schema.tables 
+            WHERE table_schema NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys', '#innodb_redo', '#innodb_temp')
+            ORDER BY table_schema
+            LIMIT 5
+        """)
+        schemas_to_query = [row[0] for row in cursor]
+    
+    if not schemas_to_query:
+        return autocomplete_data
+    
+    # Columns of the first 100 tables of each schema, one round trip per schema, grouped by table below
+    for schema in schemas_to_query:
+        try:
             cursor.execute("""
-                SELECT DISTINCT table_schema 
-                FROM information_schema.tables 
-                WHERE table_schema NOT IN ('information_schema', 'mysql', 'performance_schema', 'sys', '#innodb_redo', '#innodb_temp')
-                ORDER BY table_schema
-                LIMIT 10
-            """)
-            schemas_to_query = [row[0] for row in cursor.fetchall()]
-        
-        # Get tables and columns for each schema
-        for schema in schemas_to_query[:5]:  # Limit to 5 schemas for performance
-            try:
-                # Get tables
-                cursor.execute(f"""
+                SELECT c.table_name, c.column_name 
+                FROM (
                     SELECT table_name 
                     FROM information_schema.tables 
-                    WHERE table_schema = '{schema}'
+                    WHERE table_schema = %s
                     ORDER BY table_name
                     LIMIT 100
-                """)
-                tables = [row[0] for row in cursor.fetchall()]
-                
-                for table in tables:
-                    full_table_name = f"{schema}.{table}"
-                    autocomplete_data["tables"].append(full_table_name)
-                    autocomplete_data["tables"].append(table)  # Also add without schema
-                    
-                    # Get columns for this table
-                    try:
-                        cursor.execute(f"""
-                            SELECT column_name, data_type 
-                            FROM information_schema.columns 
-                            WHERE table_schema = '{schema}' AND table_name = '{table}'
-                            ORDER BY ordinal_position
-                        """)
-                        columns = [{"name": row[0], "type": row[1]} for row in cursor.fetchall()]
-                        autocomplete_data["columns"][full_table_name] = [col["name"] for col in columns]
-                        autocomplete_data["columns"][table] = [col["name"] for col in columns]  # Also without schema
-                    except Exception as col_error:
-                        print(f"[WARNING] Could not get columns for {full_table_name}: {col_error}")
-                        continue
-            except Exception as schema_error:
-                print(f"[WARNING] Could not query schema {schema}: {schema_error}")
-                continue
-        
-        conn.close()
-        
+                ) t
+                JOIN information_schema.columns c
+                    ON c.table_schema = %s AND c.table_name = t.table_name
+                ORDER BY c.table_name, c.ordinal_position
+            """, (schema, schema))
+            
+            # Rows are grouped as they stream off the (unbuffered) cursor - no intermediate list of every column
+            for table, rows in groupby(cursor, key=itemgetter(0)):
+                columns = [row[1] for row in rows]
+                full_table_name = f"{schema}.{table}"
+                autocomplete_data["tables"].append(full_table_name)
+                autocomplete_data["tables"].append(table)  # Also add without schema
+                autocomplete_data["columns"][full_table_name] = columns
+                autocomplete_data["columns"][table] = list(columns)  # Also without schema
+        except Exception as schema_error:
+            print(f"[WARNING] Could not query schema {schema}: {schema_error}")
+            continue
+    
+    return autocomplete_data
+
+
+@app.route('/api/schema/invalidate', methods=['POST'])
+def invalidate_schema_cache():
+    """Drop cached schema/autocomplete data and cached SQL (call after schema changes)"""
+    schema_cache.clear()
+    semantic_cache.clear()
+    if QUESTION_SQL_STORE_ENABLED:
+        question_sql_store.clear()
+    template_result_cache.clear()
+    question_result_cache.clear()
+    sql_result_cache.clear()
+    print("[CACHE] Schema and query caches cleared")
+    return jsonify({
+        "success": True
+    })
+
+
+@app.route('/api/kb/reload', methods=['POST'])
+def reload_knowledge_base():
+    """Re-read the AI knowledge base (after retraining) and drop everything derived from it"""
+    try:
+        # A new instance is built and swapped in, so no request sees a half-loaded knowledge base;
+        # cached responses built from the old one are dropped only after the swap
+        rebuild_knowledge_base()
+        question_result_cache.clear()
+        print("[KB] Knowledge base reloaded")
         return jsonify({
-            "success": True,
-            "data": autocomplete_data
+            "success": True
         })
     except Exception as e:
-        print(f"[ERROR] Autocomplete data fetch failed: {e}")
         return jsonify({
             "success": False,
-            "error": str(e),
-            "data": {"tables": [], "columns": {}, "schemas": []}
+            "error": str(e)
         }), 500
 
 
+# Agent tools whose input is the SQL that was run
+_SQL_TOOL_NAMES = frozenset(('sql_db_query', 'sql_db_query_checker', 'query_sql_db', 'query_sql_database'))
+
+# Case-insensitive keyword test without upper()-copying the whole string
+_SELECT_KEYWORD_RE = re.compile(r'SELECT', re.IGNORECASE)
+
+# SQL quoted inside a tool observation (e.g. the query checker's rewritten query)
+_OBSERVATION_SQL_RE = re.compile(r'SELECT.*?(?:;|$)', re.IGNORECASE | re.DOTALL)
+
+
 @app.route('/api/query', methods=['POST'])
 def process_query():
     """Main endpoint: Process natural language question using LangChain SQL Agent"""
@@ -846,6 +1602,13 @@ def process_query():
         print(f"[API] Received question: {question}")
         print(f"{'='*70}")
         
+        # Exact repeats within QUESTION_RESULT_TTL skip enhancement, the agent and the database
+        question_key = canonical_question(question)
+        cached_response = question_result_cache.get(question_key)
+        if cached_response is not None:
+            log.debug("[CACHE] Question result hit")
+            return jsonify(cached_response)
+        
         # Use LangChain SQL Agent
         result = generate_sql_with_agent(question)
         
@@ -859,7 +1622,7 @@ def process_query():
         output = result.get('output', '')
         intermediate_steps = result.get('intermediate_steps', [])
         
-        print(f"[API] Agent returned {len(intermediate_steps)} intermediate steps")
+        log.debug("[API] Agent returned %d intermediate steps", len(intermediate_steps))
         
         # Extract SQL query from intermediate steps
         sql_query = None
@@ -867,7 +1630,7 @@ def process_query():
         all_queries = []
         
         for i, step in enumerate(intermediate_steps):
-            print(f"[API] Step {i}: {type(step)}")
+            log.debug("[API] Step %d: %s", i, type(step))
             if len(step) >= 2:
                 action, observation = step[0], step[1]
                 
@@ -881,10 +1644,10 @@ def process_query():
                     tool_name = action.get('tool') or action.get('tool_name')
                 
                 if tool_name:
-                    print(f"[API] Tool used: {tool_name}")
+                    log.debug("[API] Tool used: %s", tool_name)
                     
                     # Check for various SQL execution tool names
-                    if tool_name in ['sql_db_query', 'sql_db_query_checker', 'query_sql_db', 'query_sql_database']:
+                    if tool_name in _SQL_TOOL_NAMES:
                         # This is the actual SQL query execution
                         query = None
                         if hasattr(action, 'tool_input'):
@@ -896,31 +1659,35 @@ def process_query():
                         
                         if query:
                             all_queries.append(query)
+                            query_str = str(query)
                             # Use the last SELECT query - keep it simple
                             # Always prefer the last query executed (most relevant to user's question)
-                            if 'SELECT' in str(query).upper():
-                                sql_query = str(query)
+                            if _SELECT_KEYWORD_RE.search(query_str):
+                                sql_query = query_str
                                 query_results = observation
-                            print(f"[API] Found SQL: {str(query)[:100]}...")
-                            print(f"[API] Query results: {str(observation)[:200]}...")
-                
-                # Also check if observation contains SQL
-                obs_str = str(observation)
-                if 'SELECT' in obs_str.upper() and len(obs_str) > 20 and len(obs_str) < 2000:
-                    # Might be SQL in the observation
-                    import re
-                    sql_match = re.search(r'SELECT.*?(?:;|$)', obs_str, re.IGNORECASE | re.DOTALL)
-                    if sql_match:
-                        potential_sql = sql_match.group(0).strip()
-                        if potential_sql and 'SELECT' in potential_sql.upper():
-                            print(f"[API] Found SQL in observation: {potential_sql[:100]}...")
-                            if not sql_query:  # Only use if we haven't found one yet
-                                sql_query = potential_sql
-                                all_queries.append(potential_sql)
+                            log.debug("[API] Found SQL: %.100s...", query_str)
+                            log.debug("[API] Query results: %.200s...", observation)
+        
+        # Fall back to SQL quoted in an observation only when no SQL tool call gave us one
+        if not sql_query:
+            for step in intermediate_steps:
+                if len(step) < 2:
+                    continue
+                obs_str = str(step[1])
+                if len(obs_str) <= 20 or len(obs_str) >= 2000:
+                    continue
+                # The match always starts with SELECT (case-insensitive), so no separate keyword check
+                sql_match = _OBSERVATION_SQL_RE.search(obs_str)
+                if sql_match:
+                    potential_sql = sql_match.group(0).strip()
+                    log.debug("[API] Found SQL in observation: %.100s...", potential_sql)
+                    sql_query = potential_sql
+                    all_queries.append(potential_sql)
+                    break
         
-        print(f"[API] Total SQL queries found: {len(all_queries)}")
-        print(f"[API] Final SQL query: {sql_query[:100] if sql_query else 'None'}")
-        print(f"[API] Agent output: {output[:500] if output else 'No output'}")
+        log.debug("[API] Total SQL queries found: %d", len(all_queries))
+        log.debug("[API] Final SQL query: %.100s", sql_query)
+        log.debug("[API] Agent output: %.500s", output or 'No output')
         
         # If we found a SQL query, re-execute it to get structured data
         if sql_query:
@@ -931,20 +1698,38 @@ def process_query():
                 if sql_query != original_sql:
                     print(f"[SQL FIX] Added schema prefixes: {original_sql[:50]}... -> {sql_query[:50]}...")
                 
-                results = execute_query(sql_query)
-                return jsonify({
+                if 'columns' in result:
+                    # Pattern/cache paths already executed this exact SQL - don't run it twice
+                    columns, results = result['columns'], query_results
+                else:
+                    columns, results = cached_execute_query(sql_query)
+                
+                # Remember SQL the agent produced so paraphrased repeats skip the LLM
+                if SEMANTIC_CACHE_ENABLED and result.get('source') == 'agent':
+                    semantic_cache.store(question, sql_query)
+                if QUESTION_SQL_STORE_ENABLED and result.get('source') == 'agent':
+                    try:
+                        question_sql_store.set(question_key, sql_query)
+                    except Exception as e:
+                        print(f"[CACHE] Could not persist question SQL: {e}")
+                
+                response = {
                     "success": True,
                     "sql": sql_query,
+                    "columns": columns,
                     "results": results,
                     "count": len(results),
                     "agent_output": output
-                })
+                }
+                question_result_cache.set(question_key, response)
+                return jsonify(response)
             except Exception as query_error:
                 print(f"[API] Query execution failed: {query_error}")
                 # Return what we have
                 return jsonify({
                     "success": True,
                     "sql": sql_query,
+                    "columns": [],
                     "results": [],
                     "count": 0,
                     "agent_output": output,
@@ -984,12 +1769,14 @@ def process_query():
         else:
             # No SQL found and no useful output
             print(f"[API] No SQL query found in agent steps")
-            print(f"[API] Agent output: {output[:500] if output else 'No output'}")
-            print(f"[API] Intermediate steps count: {len(intermediate_steps)}")
-            print(f"[API] All intermediate steps:")
-            for i, step in enumerate(intermediate_steps):
-                step_str = str(step)[:200] if step else "None"
-                print(f"  Step {i}: {step_str}")
+            log.debug("[API] Agent output: %.500s", output or 'No output')
+            log.debug("[API] Intermediate steps count: %d", len(intermediate_steps))
+            # Rendering every step is costly - skip it entirely unless DEBUG is on
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("[API] All intermediate steps:")
+                for i, step in enumerate(intermediate_steps):
+                    step_str = str(step)[:200] if step else "None"
+                    log.debug("  Step %d: %s", i, step_str)
             
             # Try to extract any error messages from steps
             error_details = []
@@ -1052,15 +1839,22 @@ def execute_custom_query():
         if sql != original_sql:
             print(f"[SQL FIX] Added schema prefixes: {original_sql[:50]}... -> {sql[:50]}...")
         
-        # Execute the validated query
-        results = execute_query(sql)
+        # Identical SQL run moments ago is answered from memory
+        cache_key = sql_cache_key(sql)
+        cached = sql_result_cache.get(cache_key)
+        if cached is not None:
+            log.debug("[CACHE] SQL result hit")
+            columns, results = cached
+            return jsonify({
+                "success": True,
+                "sql": sql,
+                "columns": columns,
+                "results": results,
+                "count": len(results)
+            })
         
-        return jsonify({
-            "success": True,
-            "sql": sql,
-            "results": results,
-            "count": len(results)
-        })
+        # Execute the validated query - rows are streamed to the client as they arrive
+        return stream_query_response(sql, cache_key)
     
     except Exception as e:
         return jsonify({
@@ -1072,6 +1866,90 @@ def execute_custom_query():
         }), 500
 
 
+# Excel export header styling - shared by every header cell instead of created per cell
+EXPORT_HEADER_FONT = Font(bold=True, color='FFFFFF')
+EXPORT_HEADER_FILL = PatternFill(start_color='1F4E78', end_color='1F4E78', fill_type='solid')
+EXPORT_HEADER_BORDER = Border(bottom=Side(style='thin'))
+EXPORT_BATCH_SIZE = 5000
+
+
+@app.route('/api/export/excel', methods=['POST'])
+def export_excel():
+    """Run a validated SELECT and download the full result as an .xlsx file"""
+    try:
+        data = request.json
+        sql = data.get('sql', '').strip() if data else ''
+        
+        is_valid, error_msg = validate_sql_query(sql)
+        if not is_valid:
+            return jsonify({
+                "success": False,
+                "error": error_msg
+            }), 403
+        
+        sql = fix_sql_schema_prefixes(sql)
+        
+        # Write-only workbook: rows are serialized as they are appended instead of kept as cell objects
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet('Results')
+        
+        with closing(get_db_connection()) as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            columns = list(cursor.column_names)
+            
+            # Column widths must be set before the first row is written
+            for index, column in enumerate(columns, start=1):
+                ws.column_dimensions[get_column_letter(index)].width = max(12, min(len(column) + 2, 50))
+            
+            header = []
+            for column in columns:
+                cell = WriteOnlyCell(ws, value=column)
+                cell.font = EXPORT_HEADER_FONT
+                cell.fill = EXPORT_HEADER_FILL
+                cell.border = EXPORT_HEADER_BORDER
+                header.append(cell)
+            ws.append(header)
+            
+            row_count = 0
+            for batch in iter(lambda: cursor.fetchmany(EXPORT_BATCH_SIZE), []):
+                for row in batch:
+                    ws.append(row)
+                row_count += len(batch)
+        
+        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
+            export_path = tmp.name
+        try:
+            wb.save(export_path)
+        except Exception:
+            # A half-written workbook would otherwise stay in the temp directory
+            os.remove(export_path)
+            raise
+        log.debug("[EXPORT] %d rows written to Excel", row_count)
+        
+        response = send_file(
+            export_path,
+            as_attachment=True,
+            download_name=f"query_results_{datetime.now():%Y%m%d_%H%M%S}.xlsx",
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            conditional=True
+        )
+        
+        def remove_export():
+            try:
+                os.remove(export_path)
+            except OSError:
+                pass
+        response.call_on_close(remove_export)
+        return response
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Export failed: {str(e)}"
+        }), 500
+
+
 if __name__ == '__main__':
     print("\n" + "="*70)
     print("  Loanlytics AI Backend Starting...")
@@ -1088,9 +1966,16 @@ if __name__ == '__main__':
             print(f"  [Schemas]  {len(MYSQL_SCHEMAS)} schemas: {', '.join(MYSQL_SCHEMAS[:3])}{'...' if len(MYSQL_SCHEMAS) > 3 else ''}")
         print(f"  [AI Model] {OPENAI_MODEL}")
         print(f"  [Server]   http://localhost:5000")
-        print(f"  [Info]     Database connection will be established on first query")
+        if WARMUP_ENABLED:
+            print(f"  [Info]     Database connection and schema metadata are prefetched in the background")
+        else:
+            print(f"  [Info]     Database connection will be established on first query")
         print(f"  [Info]     Multi-schema support enabled for cross-schema queries")
         print("\n" + "="*70 + "\n")
     
+    # Warm up before the first request (only in the reloader's serving process)
+    if WARMUP_ENABLED and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up()
+    
     app.run(debug=True, host='0.0.0.0', port=5000)
 
@@ -0,0 +1,70 @@
+"""
+Question SQL Store
+Persists the SQL the agent generated for each question, so repeats survive a restart without an LLM call
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class QuestionSQLStore:
+    """Disk-backed canonical question -> SQL map (SQLite; safe across threads and worker processes)"""
+
+    # Bump whenever canonical_question changes, so rows stored under the old key format are dropped
+    KEY_VERSION = 2
+
+    def __init__(self, path, ttl=604800):
+        """
+        path: SQLite database file (created on first use)
+        ttl: seconds a stored question stays valid
+        """
+        self.path = path
+        self.ttl = ttl
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Open the database on first use in this process (caller holds the lock)"""
+        # Connections must not be shared with forked workers, so reopen after a fork
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS question_sql (question TEXT PRIMARY KEY, sql TEXT NOT NULL, created_at REAL NOT NULL)")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != self.KEY_VERSION:
+                conn.execute("DELETE FROM question_sql")
+                conn.execute(f"PRAGMA user_version = {self.KEY_VERSION}")
+            # Age out stale entries once per process instead of on every lookup
+            conn.execute("DELETE FROM question_sql WHERE created_at < ?", (time.time() - self.ttl,))
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, question):
+        """Return the stored SQL for a canonical question, or None if missing or expired"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT sql FROM question_sql WHERE question = ? AND created_at >= ?",
+                (question, time.time() - self.ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, question, sql):
+        """Store (or refresh) the SQL that answered a canonical question"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO question_sql (question, sql, created_at) VALUES (?, ?, ?)",
+                (question, sql, time.time())
+            )
+            conn.commit()
+
+    def clear(self):
+        """Drop every stored question (e.g. after schema changes)"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM question_sql")
+            conn.commit()
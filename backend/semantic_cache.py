@@ -0,0 +1,144 @@
+"""
+Semantic Cache
+Reuses SQL generated for earlier questions when a new question means the same thing
+"""
+
+import functools
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+
+log = logging.getLogger('loanlytics')
+
+# Numbers in a question ("top 10", "2023") change the SQL, so they must match exactly
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+# Sentence-ending punctuation; operators ("<", ">=", "!=", "10%") change the SQL, so they are kept
+_TRAILING_PUNCTUATION_RE = re.compile(r'[\s?.!]+$')
+
+
+def normalize_question(question):
+    """Lowercase and collapse whitespace so trivially different phrasings share a key"""
+    return ' '.join(question.lower().split())
+
+
+def canonical_question(question):
+    """normalize_question, also ignoring a trailing "?", "." or "!" ("Top 10 customers?" == "top 10 customers")"""
+    return normalize_question(_TRAILING_PUNCTUATION_RE.sub('', question))
+
+
+class SemanticCache:
+    """Question -> SQL cache matched by embedding cosine similarity"""
+
+    def __init__(self, embed, threshold=0.95, ttl=3600, max_entries=512, intent=None):
+        """
+        embed: callable(text) -> list of floats (e.g. OpenAIEmbeddings().embed_query)
+        threshold: minimum cosine similarity for a hit
+        ttl: seconds an entry stays valid
+        intent: callable(normalized question) -> hashable that must also match for a hit
+                (e.g. its keyword set, so "active loans" never reuses "closed loans")
+        """
+        self.threshold = threshold
+        self.intent = intent
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._embed_cached = functools.lru_cache(maxsize=256)(self._embed_normalized(embed))
+        self._lock = threading.Lock()
+        self.clear()
+
+    @staticmethod
+    def _embed_normalized(embed):
+        """Wrap the embedder so it returns a unit-length vector (dot product == cosine)"""
+        def embed_unit(text):
+            vector = np.asarray(embed(text), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else vector
+        return embed_unit
+
+    def clear(self):
+        """Drop every cached entry (e.g. after schema changes)"""
+        with self._lock:
+            self._entries = []  # (question, guard, sql, created_at)
+            self._vectors = None
+            self._exact = {}
+
+    def _expire(self, now):
+        """Remove entries older than ttl (caller holds the lock)"""
+        keep = [i for i, entry in enumerate(self._entries) if now - entry[3] < self.ttl]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep else None
+            self._exact = {entry[0]: i for i, entry in enumerate(self._entries)}
+
+    def _guard(self, normalized):
+        """What a similar question must share exactly to reuse the SQL: its numbers and its intent"""
+        numbers = tuple(_NUMBER_RE.findall(normalized))
+        return numbers, (self.intent(normalized) if self.intent else None)
+
+    def lookup(self, question):
+        """Return cached SQL for a question with the same meaning, or None"""
+        normalized = normalize_question(question)
+        guard = self._guard(normalized)
+        now = time.time()
+
+        with self._lock:
+            self._expire(now)
+            if not self._entries:
+                return None
+            # Exact repeats skip the embedding call entirely
+            if normalized in self._exact:
+                return self._entries[self._exact[normalized]][2]
+
+        try:
+            vector = self._embed_cached(normalized)
+        except Exception as e:
+            print(f"[CACHE] Embedding failed, skipping semantic cache: {e}")
+            return None
+
+        with self._lock:
+            if self._vectors is None:
+                return None
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            score = float(similarities[best])
+            cached_question, cached_guard, sql, _ = self._entries[best]
+
+        if score >= self.threshold and cached_guard == guard:
+            log.debug("[CACHE] Semantic hit (%.3f): '%.80s'", score, cached_question)
+            return sql
+
+        return None
+
+    def store(self, question, sql):
+        """Remember the SQL that answered a question"""
+        normalized = normalize_question(question)
+        guard = self._guard(normalized)
+
+        try:
+            vector = self._embed_cached(normalized)
+        except Exception as e:
+            print(f"[CACHE] Embedding failed, not caching question: {e}")
+            return
+
+        with self._lock:
+            self._expire(time.time())
+            if normalized in self._exact:
+                index = self._exact[normalized]
+                self._entries[index] = (normalized, guard, sql, time.time())
+                self._vectors[index] = vector
+                return
+
+            # Evict the oldest entry once full
+            if len(self._entries) >= self.max_entries:
+                self._entries.pop(0)
+                self._vectors = self._vectors[1:]
+                self._exact = {entry[0]: i for i, entry in enumerate(self._entries)}
+
+            self._exact[normalized] = len(self._entries)
+            self._entries.append((normalized, guard, sql, time.time()))
+            row = vector[np.newaxis, :]
+            self._vectors = row if self._vectors is None or not len(self._vectors) else np.vstack([self._vectors, row])
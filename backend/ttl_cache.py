@@ -0,0 +1,55 @@
+"""
+TTL Cache
+Keeps rarely-changing results (schema listings, autocomplete data) in memory for a fixed time
+"""
+
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe key -> value cache whose entries expire ttl seconds after being stored"""
+
+    def __init__(self, ttl=300, max_entries=None):
+        """
+        ttl: seconds an entry stays valid
+        max_entries: optional size cap - expired entries, then the oldest, are evicted when full
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (value, expires_at), in insertion order
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return default
+            return entry[0]
+
+    def set(self, key, value):
+        """Store value under key for ttl seconds"""
+        now = time.monotonic()
+        with self._lock:
+            # Re-insert so the dict order stays oldest-first
+            self._entries.pop(key, None)
+            if self.max_entries is not None and len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[key] = (value, now + self.ttl)
+
+    def _evict(self, now):
+        """Make room for one entry (caller holds the lock)"""
+        expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        """Drop every entry (e.g. after schema changes)"""
+        with self._lock:
+            self._entries.clear()
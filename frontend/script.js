@@ -4,6 +4,7 @@ const API_URL = 'http://localhost:5000/api';
 // Query mode state
 let isSQLMode = false;
 let sqlEditor = null;
+let currentSQL = null;  // SQL behind the displayed results (used by Excel export)
 
 // Check backend health on load
 window.addEventListener('load', checkHealth);
@@ -54,7 +55,7 @@ async function askQuestion() {
         const data = await response.json();
         
         if (data.success) {
-            displayResults(data.sql, data.results, data.count, data.note, data.agent_output);
+            displayResults(data.sql, data.columns, data.results, data.count, data.note, data.agent_output);
         } else {
             // Show error with suggestion if available
             const errorMsg = data.error + (data.suggestion ? `\n\nSuggestion: ${data.suggestion}` : '');
@@ -68,7 +69,8 @@ async function askQuestion() {
 }
 
 // Display Results
-function displayResults(sql, results, count, note, agentOutput) {
+// Rows arrive as arrays in the same order as columns
+function displayResults(sql, columns, results, count, note, agentOutput) {
     // Show results section
     document.getElementById('resultsSection').style.display = 'block';
     
@@ -78,6 +80,7 @@ function displayResults(sql, results, count, note, agentOutput) {
         sqlDisplay = `-- NOTE: ${note}\n${sql}`;
     }
     document.getElementById('sqlQuery').textContent = sqlDisplay;
+    currentSQL = sql;
     
     // Display results table
     const tableContainer = document.getElementById('resultsTable');
@@ -94,7 +97,7 @@ function displayResults(sql, results, count, note, agentOutput) {
     // Header
     const thead = table.createTHead();
     const headerRow = thead.insertRow();
-    Object.keys(results[0]).forEach(key => {
+    columns.forEach(key => {
         const th = document.createElement('th');
         th.textContent = key;
         headerRow.appendChild(th);
@@ -104,7 +107,7 @@ function displayResults(sql, results, count, note, agentOutput) {
     const tbody = table.createTBody();
     results.forEach(row => {
         const tr = tbody.insertRow();
-        Object.values(row).forEach(value => {
+        row.forEach(value => {
             const td = tr.insertCell();
             // Handle long text in 'answer' field
             if (typeof value === 'string' && value.length > 200) {
@@ -210,6 +213,37 @@ function exportToCSV() {
     window.URL.revokeObjectURL(url);
 }
 
+// Export to Excel (server re-runs the query so the file has every row)
+async function exportToExcel() {
+    if (!currentSQL) return;
+    
+    try {
+        const response = await fetch(`${API_URL}/export/excel`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ sql: currentSQL })
+        });
+        
+        if (!response.ok) {
+            const data = await response.json();
+            showError(data.error);
+            return;
+        }
+        
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = `query_results_${Date.now()}.xlsx`;
+        a.click();
+        window.URL.revokeObjectURL(url);
+    } catch (error) {
+        showError(`Export failed: ${error.message}`);
+    }
+}
+
 // Clear Results
 function clearResults() {
     document.getElementById('questionInput').value = '';
@@ -369,10 +403,13 @@ async function executeCustomSQL() {
         const data = await response.json();
         
         if (data.success) {
-            displayResults(data.sql, data.results, data.count);
-        } else {
+            displayResults(data.sql, data.columns, data.results, data.count);
+        } else if (response.status === 403) {
             // Show validation error
             showError(`Query Validation Error: ${data.error}\n\nOnly SELECT queries are allowed. Operations like INSERT, UPDATE, DELETE, DROP, etc. are blocked for security.`);
+        } else {
+            // Execution failed - possibly part-way through a streamed (status 200) result, so the rows are incomplete
+            showError(data.error);
         }
     } catch (error) {
         showError(`Request failed: ${error.message}`);
@@ -3,18 +3,18 @@ Apply learned join patterns from bi.report_master to schema metadata
 This automatically trains the AI based on real production queries
 """
 
-import json
+import orjson
 
 def apply_learned_patterns():
     """Apply learned patterns to schema metadata"""
     
     # Load learned patterns
-    with open('learned_join_patterns.json', 'r', encoding='utf-8') as f:
-        learned = json.load(f)
+    with open('learned_join_patterns.json', 'rb') as f:
+        learned = orjson.loads(f.read())
     
     # Load schema metadata
-    with open('schema_metadata_filtered.json', 'r', encoding='utf-8') as f:
-        metadata = json.load(f)
+    with open('schema_metadata_filtered.json', 'rb') as f:
+        metadata = orjson.loads(f.read())
     
     print("="*80)
     print("APPLYING LEARNED JOIN PATTERNS TO SCHEMA METADATA")
@@ -30,6 +30,9 @@ def apply_learned_patterns():
         'ams': 'ams'
     }
     
+    # Learned keys are lowercase but metadata keys keep the real schema case (financialForms)
+    metadata_keys = {key.lower(): key for key in metadata}
+    
     for table_key, patterns in learned.items():
         # Parse table name: PERDIX_DB.TABLE_NAME or ENCORE_DB.TABLE_NAME
         table_parts = table_key.lower().replace('_db', '').split('.')
@@ -40,21 +43,23 @@ def apply_learned_patterns():
             actual_schema = schema_mapping.get(schema_key, schema_key)
             full_name = f"{actual_schema}.{table}"
             
-            # Find matching table in metadata
-            if full_name in metadata:
+            # Find matching table in metadata (case-insensitive)
+            metadata_key = metadata_keys.get(full_name.lower())
+            if metadata_key:
                 # Update with learned patterns
-                metadata[full_name]['common_joins'] = patterns['common_joins']
-                metadata[full_name]['description'] = f"Used in {patterns['usage_count']} production reports"
-                metadata[full_name]['business_meaning'] = f"Production table (usage: {patterns['usage_count']} queries)"
+                table_meta = metadata[metadata_key]
+                table_meta['common_joins'] = patterns['common_joins']
+                table_meta['description'] = f"Used in {patterns['usage_count']} production reports"
+                table_meta['business_meaning'] = f"Production table (usage: {patterns['usage_count']} queries)"
                 
-                print(f"[UPDATED] {full_name}")
+                print(f"[UPDATED] {metadata_key}")
                 print(f"   Usage: {patterns['usage_count']} reports")
                 print(f"   Joins: {len(patterns['common_joins'])} patterns learned")
                 updated_count += 1
     
     # Save updated metadata
-    with open('schema_metadata_filtered.json', 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    with open('schema_metadata_filtered.json', 'wb') as f:
+        f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
     
     print(f"\n{'='*80}")
     print(f"[SUCCESS] Updated {updated_count} tables with learned patterns")
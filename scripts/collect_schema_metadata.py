@@ -5,8 +5,14 @@ Collects comprehensive table information including indexes
 
 import mysql.connector
 from dotenv import load_dotenv
+import argparse
+import hashlib
 import os
+import re
 import json
+import orjson
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
@@ -21,134 +27,207 @@ DB_CONFIG = {
 # Only collect these schemas for training
 SCHEMAS = ['encoredb', 'financialForms']
 
-def collect_metadata():
-    """Collect comprehensive metadata about all tables"""
+METADATA_FILE = 'schema_metadata.json'
+# Stamp of the catalog METADATA_FILE was collected from - --reuse-cache reuses the file while it matches
+STAMP_FILE = 'schema_metadata.stamp.json'
+
+
+def schema_stamp(cursor):
+    """Cheap per-schema fingerprint: table and column counts plus newest create/update time (one query)"""
+    placeholders = ', '.join(['%s'] * len(SCHEMAS))
+    cursor.execute(f"""
+        SELECT t.table_schema, COUNT(*) AS table_count,
+            (SELECT COUNT(*) FROM information_schema.columns c WHERE c.table_schema = t.table_schema) AS column_count,
+            MAX(t.create_time) AS created, MAX(t.update_time) AS updated
+        FROM information_schema.tables t
+        WHERE t.table_schema IN ({placeholders})
+        GROUP BY t.table_schema
+    """, tuple(SCHEMAS))
+    return {
+        row['table_schema']: [row['table_count'], row['column_count'], str(row['created']), str(row['updated'])]
+        for row in cursor.fetchall()
+    }
+
+
+def load_cached_metadata(stamp):
+    """Return the previously collected metadata if it was collected from the same catalog, else None"""
+    try:
+        with open(STAMP_FILE, 'r', encoding='utf-8') as f:
+            if json.load(f) != stamp:
+                return None
+        with open(METADATA_FILE, 'rb') as f:
+            return orjson.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def collect_schema(schema):
+    """Collect metadata for every table of one schema on its own connection (4 queries)"""
     conn = mysql.connector.connect(**DB_CONFIG)
     cursor = conn.cursor(dictionary=True)
-    
     metadata = {}
     
-    for schema in SCHEMAS:
-        print(f"\n{'='*80}")
-        print(f"Schema: {schema}")
-        print(f"{'='*80}")
-        
-        # Get all tables
-        cursor.execute(f"""
-            SELECT table_name, table_comment, table_rows
-            FROM information_schema.tables 
-            WHERE table_schema = '{schema}' 
-            AND table_type = 'BASE TABLE'
-            ORDER BY table_name
-        """)
+    # Get all tables
+    cursor.execute("""
+        SELECT table_name, table_comment, table_rows
+        FROM information_schema.tables 
+        WHERE table_schema = %s 
+        AND table_type = 'BASE TABLE'
+        ORDER BY table_name
+    """, (schema,))
+    
+    tables = cursor.fetchall()
+    
+    # Columns, indexes and foreign keys for the whole schema - one query each instead of per table
+    cursor.execute("""
+        SELECT 
+            table_name,
+            column_name,
+            column_type,
+            column_key,
+            column_comment,
+            is_nullable
+        FROM information_schema.columns
+        WHERE table_schema = %s
+        ORDER BY table_name, ordinal_position
+    """, (schema,))
+    
+    columns_by_table = defaultdict(list)
+    for col in cursor:
+        columns_by_table[col['table_name']].append(col)
+    
+    cursor.execute("""
+        SELECT 
+            table_name,
+            index_name,
+            GROUP_CONCAT(column_name ORDER BY seq_in_index) as columns,
+            non_unique,
+            index_type
+        FROM information_schema.statistics
+        WHERE table_schema = %s
+        GROUP BY table_name, index_name, non_unique, index_type
+        ORDER BY table_name, index_name
+    """, (schema,))
+    
+    indexes_by_table = defaultdict(list)
+    for idx in cursor:
+        indexes_by_table[idx['table_name']].append(idx)
+    
+    cursor.execute("""
+        SELECT 
+            table_name,
+            constraint_name,
+            column_name,
+            referenced_table_schema,
+            referenced_table_name,
+            referenced_column_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = %s 
+        AND referenced_table_name IS NOT NULL
+    """, (schema,))
+    
+    foreign_keys_by_table = defaultdict(list)
+    for fk in cursor:
+        foreign_keys_by_table[fk['table_name']].append(fk)
+    
+    for table in tables:
+        table_name = table['table_name']
+        full_name = f"{schema}.{table_name}"
         
-        tables = cursor.fetchall()
+        columns = columns_by_table.get(table_name, [])
+        indexes = indexes_by_table.get(table_name, [])
+        foreign_keys = foreign_keys_by_table.get(table_name, [])
         
-        for table in tables:
-            table_name = table['table_name']
-            full_name = f"{schema}.{table_name}"
-            
-            print(f"\nTable: {table_name}")
-            print(f"  Rows: {table['table_rows']:,}")
-            print(f"  Comment: {table['table_comment'] or 'None'}")
-            
-            # Get columns
-            cursor.execute(f"""
-                SELECT 
-                    column_name,
-                    column_type,
-                    column_key,
-                    column_comment,
-                    is_nullable
-                FROM information_schema.columns
-                WHERE table_schema = '{schema}' AND table_name = '{table_name}'
-                ORDER BY ordinal_position
-            """)
-            
-            columns = cursor.fetchall()
-            
-            # Get indexes
-            cursor.execute(f"""
-                SELECT 
-                    index_name,
-                    GROUP_CONCAT(column_name ORDER BY seq_in_index) as columns,
-                    non_unique,
-                    index_type
-                FROM information_schema.statistics
-                WHERE table_schema = '{schema}' AND table_name = '{table_name}'
-                GROUP BY index_name, non_unique, index_type
-            """)
-            
-            indexes = cursor.fetchall()
-            
-            # Get foreign keys
-            cursor.execute(f"""
-                SELECT 
-                    constraint_name,
-                    column_name,
-                    referenced_table_schema,
-                    referenced_table_name,
-                    referenced_column_name
-                FROM information_schema.key_column_usage
-                WHERE table_schema = '{schema}' 
-                AND table_name = '{table_name}'
-                AND referenced_table_name IS NOT NULL
-            """)
-            
-            foreign_keys = cursor.fetchall()
-            
-            # Store metadata
-            metadata[full_name] = {
-                'schema': schema,
-                'table': table_name,
-                'comment': table['table_comment'] or '',
-                'row_count': table['table_rows'],
-                'columns': [
-                    {
-                        'name': col['column_name'],
-                        'type': col['column_type'],
-                        'nullable': col['is_nullable'] == 'YES',
-                        'key': col['column_key'],
-                        'comment': col['column_comment'] or ''
-                    }
-                    for col in columns
-                ],
-                'indexes': [
-                    {
-                        'name': idx['index_name'],
-                        'columns': idx['columns'].split(','),
-                        'unique': idx['non_unique'] == 0,
-                        'type': idx['index_type']
-                    }
-                    for idx in indexes
-                ],
-                'foreign_keys': [
-                    {
-                        'column': fk['column_name'],
-                        'references': f"{fk['referenced_table_schema']}.{fk['referenced_table_name']}.{fk['referenced_column_name']}"
-                    }
-                    for fk in foreign_keys
-                ],
-                # User fills these in:
-                'description': '',  # What data does this table hold?
-                'common_joins': [],  # How does it join with other tables?
-                'business_meaning': ''  # What business entity does this represent?
-            }
-            
-            print(f"  Columns: {len(columns)}")
-            print(f"  Indexes: {', '.join([idx['index_name'] for idx in indexes])}")
-            if foreign_keys:
-                print(f"  Foreign Keys: {len(foreign_keys)}")
+        # Store metadata
+        metadata[full_name] = {
+            'schema': schema,
+            'table': table_name,
+            'comment': table['table_comment'] or '',
+            'row_count': table['table_rows'],
+            'columns': [
+                {
+                    'name': col['column_name'],
+                    'type': col['column_type'],
+                    'nullable': col['is_nullable'] == 'YES',
+                    'key': col['column_key'],
+                    'comment': col['column_comment'] or ''
+                }
+                for col in columns
+            ],
+            'indexes': [
+                {
+                    'name': idx['index_name'],
+                    'columns': idx['columns'].split(','),
+                    'unique': idx['non_unique'] == 0,
+                    'type': idx['index_type']
+                }
+                for idx in indexes
+            ],
+            'foreign_keys': [
+                {
+                    'column': fk['column_name'],
+                    'references': f"{fk['referenced_table_schema']}.{fk['referenced_table_name']}.{fk['referenced_column_name']}"
+                }
+                for fk in foreign_keys
+            ],
+            # User fills these in:
+            'description': '',  # What data does this table hold?
+            'common_joins': [],  # How does it join with other tables?
+            'business_meaning': ''  # What business entity does this represent?
+        }
     
     conn.close()
+    return metadata
+
+
+def print_schema_summary(schema, schema_metadata):
+    """Print the per-table collection summary for one schema"""
+    print(f"\n{'='*80}")
+    print(f"Schema: {schema}")
+    print(f"{'='*80}")
+    
+    for info in schema_metadata.values():
+        print(f"\nTable: {info['table']}")
+        print(f"  Rows: {info['row_count']:,}")
+        print(f"  Comment: {info['comment'] or 'None'}")
+        print(f"  Columns: {len(info['columns'])}")
+        print(f"  Indexes: {', '.join([idx['name'] for idx in info['indexes']])}")
+        if info['foreign_keys']:
+            print(f"  Foreign Keys: {len(info['foreign_keys'])}")
+
+
+def collect_metadata(reuse_cache=False):
+    """Collect comprehensive metadata about all tables (with reuse_cache, reuse the last run's file if the schema stamp is unchanged)"""
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor(dictionary=True)
+    
+    stamp = schema_stamp(cursor)
+    conn.close()
+    if reuse_cache:
+        # Row counts and other statistics in the reused file are as of the last collection
+        cached = load_cached_metadata(stamp)
+        if cached is not None:
+            print(f"Schema unchanged since last run - using {METADATA_FILE} ({len(cached)} tables)")
+            return cached
+    
+    # Schemas are independent - collect them concurrently, one connection each
+    with ThreadPoolExecutor(max_workers=len(SCHEMAS)) as executor:
+        results = list(executor.map(collect_schema, SCHEMAS))
+    
+    metadata = {}
+    for schema, schema_metadata in zip(SCHEMAS, results):
+        print_schema_summary(schema, schema_metadata)
+        metadata.update(schema_metadata)
     
     # Save to JSON file
-    with open('schema_metadata.json', 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    with open(METADATA_FILE, 'wb') as f:
+        f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
+    with open(STAMP_FILE, 'w', encoding='utf-8') as f:
+        json.dump(stamp, f)
     
     print(f"\n{'='*80}")
     print(f"Metadata collected for {len(metadata)} tables")
-    print(f"Saved to: schema_metadata.json")
+    print(f"Saved to: {METADATA_FILE}")
     print(f"{'='*80}")
     
     # Create human-readable format for user to fill in
@@ -157,59 +236,118 @@ def collect_metadata():
     return metadata
 
 
+# Fill-in section appended after every table - identical for all tables
+TRAINING_FILL_IN = (
+    "\n"
+    + "="*50 + " FILL IN BELOW " + "="*50 + "\n\n"
+    "DESCRIPTION (what data does this table hold?):\n"
+    "  \n\n"
+    "BUSINESS MEANING (what business entity does this represent?):\n"
+    "  \n\n"
+    "COMMON JOINS (how does it join with other tables?):\n"
+    "  Example: JOIN {other_table} ON {this_table}.{column} = {other_table}.{column}\n"
+    "  \n\n"
+    "\n\n"
+)
+
+
+TRAINING_FILE = 'SCHEMA_TRAINING.txt'
+# Hash of the metadata TRAINING_FILE was generated from
+TRAINING_STAMP_FILE = 'SCHEMA_TRAINING.stamp'
+
+_TRAINING_TABLE_RE = re.compile(r'\nTABLE: (\S+)\n')
+_FILL_IN_MARKER = "="*50 + " FILL IN BELOW "
+
+
+def read_filled_sections(path):
+    """Return {table: fill-in section} from an existing training file, so regenerating keeps user edits"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            sections = f.read().split("="*100)
+    except OSError:
+        return {}
+    
+    # Each table is "=" * 100, "\nTABLE: name\n", "=" * 100, then its body ending in the fill-in section
+    filled = {}
+    for header, body in zip(sections, sections[1:]):
+        match = _TRAINING_TABLE_RE.fullmatch(header)
+        if match and _FILL_IN_MARKER in body:
+            fill_in = body[body.index(_FILL_IN_MARKER):]
+            filled[match.group(1)] = "\n" + fill_in.rstrip('\n') + "\n\n\n\n"
+    return filled
+
+
 def create_training_template(metadata):
-    """Create a template file for user to fill in relationships"""
-    
-    with open('SCHEMA_TRAINING.txt', 'w', encoding='utf-8') as f:
-        f.write("="*100 + "\n")
-        f.write("LOANLYTICS AI - SCHEMA TRAINING FILE\n")
-        f.write("="*100 + "\n\n")
-        f.write("Instructions: Fill in the descriptions, common_joins, and business_meaning for each table.\n")
-        f.write("This will help the AI understand your database structure and generate accurate queries.\n\n")
+    """Create a template file for user to fill in relationships (kept as-is if the metadata is unchanged)"""
+    
+    stamp = hashlib.blake2b(orjson.dumps(metadata, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    try:
+        with open(TRAINING_STAMP_FILE, 'r', encoding='utf-8') as f:
+            unchanged = f.read() == stamp and os.path.exists(TRAINING_FILE)
+    except OSError:
+        unchanged = False
+    if unchanged:
+        print(f"Training template unchanged: {TRAINING_FILE}")
+        return
+    
+    # Descriptions/joins already filled in for a table are carried over into the new file
+    filled = read_filled_sections(TRAINING_FILE)
+    
+    # Assemble the whole document in memory and write it once
+    chunks = [
+        "="*100 + "\n",
+        "LOANLYTICS AI - SCHEMA TRAINING FILE\n",
+        "="*100 + "\n\n",
+        "Instructions: Fill in the descriptions, common_joins, and business_meaning for each table.\n",
+        "This will help the AI understand your database structure and generate accurate queries.\n\n"
+    ]
+    
+    for table_name, info in sorted(metadata.items()):
+        chunks.append(
+            "\n" + "="*100 + "\n"
+            f"TABLE: {table_name}\n"
+            + "="*100 + "\n"
+            f"Row Count: {info['row_count']:,}\n"
+            f"Current Comment: {info['comment']}\n\n"
+        )
         
-        for table_name, info in sorted(metadata.items()):
-            f.write("\n" + "="*100 + "\n")
-            f.write(f"TABLE: {table_name}\n")
-            f.write("="*100 + "\n")
-            f.write(f"Row Count: {info['row_count']:,}\n")
-            f.write(f"Current Comment: {info['comment']}\n\n")
-            
-            # Show key columns
-            f.write("KEY COLUMNS:\n")
-            for col in info['columns']:
-                if col['key'] or 'id' in col['name'].lower() or 'code' in col['name'].lower():
-                    f.write(f"  - {col['name']} ({col['type']}) {col['key']}\n")
-            
-            # Show indexes
-            f.write("\nINDEXES:\n")
-            for idx in info['indexes']:
-                unique = "UNIQUE" if idx['unique'] else ""
-                f.write(f"  - {idx['name']} {unique} on ({', '.join(idx['columns'])})\n")
-            
-            # Show foreign keys if any
-            if info['foreign_keys']:
-                f.write("\nFOREIGN KEYS:\n")
-                for fk in info['foreign_keys']:
-                    f.write(f"  - {fk['column']} -> {fk['references']}\n")
-            
-            f.write("\n")
-            f.write("="*50 + " FILL IN BELOW " + "="*50 + "\n\n")
-            f.write("DESCRIPTION (what data does this table hold?):\n")
-            f.write("  \n\n")
-            f.write("BUSINESS MEANING (what business entity does this represent?):\n")
-            f.write("  \n\n")
-            f.write("COMMON JOINS (how does it join with other tables?):\n")
-            f.write("  Example: JOIN {other_table} ON {this_table}.{column} = {other_table}.{column}\n")
-            f.write("  \n\n")
-            f.write("\n\n")
-    
-    print(f"Training template created: SCHEMA_TRAINING.txt")
+        # Show key columns
+        chunks.append("KEY COLUMNS:\n")
+        for col in info['columns']:
+            name_lower = col['name'].lower()
+            if col['key'] or 'id' in name_lower or 'code' in name_lower:
+                chunks.append(f"  - {col['name']} ({col['type']}) {col['key']}\n")
+        
+        # Show indexes
+        chunks.append("\nINDEXES:\n")
+        for idx in info['indexes']:
+            unique = "UNIQUE" if idx['unique'] else ""
+            chunks.append(f"  - {idx['name']} {unique} on ({', '.join(idx['columns'])})\n")
+        
+        # Show foreign keys if any
+        if info['foreign_keys']:
+            chunks.append("\nFOREIGN KEYS:\n")
+            for fk in info['foreign_keys']:
+                chunks.append(f"  - {fk['column']} -> {fk['references']}\n")
+        
+        chunks.append(filled.get(table_name, TRAINING_FILL_IN))
+    
+    with open(TRAINING_FILE, 'w', encoding='utf-8') as f:
+        f.write(''.join(chunks))
+    with open(TRAINING_STAMP_FILE, 'w', encoding='utf-8') as f:
+        f.write(stamp)
+    
+    print(f"Training template created: {TRAINING_FILE}")
     print(f"Please fill in the descriptions and relationships in this file.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect schema metadata for AI training")
+    parser.add_argument('--reuse-cache', action='store_true', help="reuse the last run's metadata if the schema looks unchanged (row counts may be stale)")
+    args = parser.parse_args()
+    
     print("Collecting schema metadata...")
-    metadata = collect_metadata()
+    metadata = collect_metadata(reuse_cache=args.reuse_cache)
     print("\nNext steps:")
     print("1. Open SCHEMA_TRAINING.txt")
     print("2. Fill in descriptions and relationships for key tables")
@@ -3,8 +3,38 @@ Comprehensive AI Training System
 Uses deep analysis to train the LLM with production knowledge
 """
 
-import json
-from collections import defaultdict
+import re
+import orjson
+from collections import Counter, defaultdict
+
+# Aggregate function -> aggregation_patterns list it feeds (others are not learned)
+AGGREGATION_BUCKETS = {'SUM': 'sum_columns', 'COUNT': 'count_columns', 'MAX': 'max_columns'}
+
+# 'par' (portfolio at risk) / 'npa' as a token - digits and '_' may follow ('PAR30', 'npa_list'),
+# but not letters, so 'department', 'partner' or 'unpaid' do not count
+_PAR_NPA_RE = re.compile(r'(?<![a-z])(?:par|npa)(?![a-z])')
+
+# Report-name keyword tests for common_queries - a report is added to every pattern it matches
+# Substring tests on the lowercased name, so 'PAR30 Report' and 'LoanDisbursement Summary' still match
+QUERY_PATTERN_RULES = (
+    ('customer_loan_amount', lambda name: 'customer' in name and ('outstanding' in name or 'loan' in name)),
+    ('product_disbursement', lambda name: 'product' in name or 'disbursement' in name),
+    ('branch_collection', lambda name: 'branch' in name or 'collection' in name),
+    ('outstanding_report', lambda name: 'outstanding' in name or 'portfolio' in name),
+    ('par_npa_report', lambda name: bool(_PAR_NPA_RE.search(name)))
+)
+
+
+def most_common(counter, n):
+    """The n most frequent keys of a Counter; ties keep first-seen order (a Counter iterates in insertion order)"""
+    ranked = sorted(enumerate(counter.items()), key=lambda entry: (-entry[1][1], entry[0]))
+    return [key for _, (key, _) in ranked[:n]]
+
+
+def load_json(path):
+    """Parse a JSON input file with orjson (it takes bytes, not file objects)"""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
 
 def build_comprehensive_knowledge():
     """Build comprehensive knowledge base for AI"""
@@ -14,16 +44,13 @@ def build_comprehensive_knowledge():
     print("="*80)
     
     # Load deep analysis
-    with open('reports_deep_analysis.json', 'r', encoding='utf-8') as f:
-        deep_analysis = json.load(f)
+    deep_analysis = load_json('reports_deep_analysis.json')
     
     # Load learned patterns
-    with open('learned_join_patterns.json', 'r', encoding='utf-8') as f:
-        join_patterns = json.load(f)
+    join_patterns = load_json('learned_join_patterns.json')
     
     # Load schema metadata
-    with open('schema_metadata_filtered.json', 'r', encoding='utf-8') as f:
-        schema_metadata = json.load(f)
+    schema_metadata = load_json('schema_metadata_filtered.json')
     
     knowledge = {
         'table_relationships': {},
@@ -33,26 +60,74 @@ def build_comprehensive_knowledge():
         'business_rules': {}
     }
     
-    # 1. Build comprehensive table relationships
-    print("\n[1] Building table relationship knowledge...")
+    # One pass over the reports feeds the relationship, query pattern, aggregation and filter sections
+    query_patterns = {pattern_type: [] for pattern_type, _ in QUERY_PATTERN_RULES}
     table_joins = defaultdict(lambda: {'joins_with': set(), 'join_conditions': [], 'usage_count': 0})
+    # Aggregations/filters are counted so the exported few are the most used, not an arbitrary pick
+    agg_by_table = defaultdict(lambda: {'sum_columns': Counter(), 'count_columns': Counter(), 'max_columns': Counter()})
+    filter_by_table = defaultdict(lambda: {'equality_filters': Counter(), 'date_filters': Counter(), 'null_checks': Counter()})
     
     for analysis in deep_analysis:
+        report_name = analysis['report_name']
         tables = [t[0] for t in analysis['tables']]
+        joins = analysis['joins']
+        aggregations = analysis['aggregations']
         
-        for join in analysis['joins']:
+        # Query patterns: one entry per report, shared by every pattern it matches
+        name = report_name.lower()
+        matched = [pattern_type for pattern_type, matches in QUERY_PATTERN_RULES if matches(name)]
+        if matched:
+            pattern_entry = {
+                'report': report_name,
+                'tables': tables,
+                'joins': joins,
+                'aggregations': aggregations
+            }
+            for pattern_type in matched:
+                query_patterns[pattern_type].append(pattern_entry)
+        
+        for join in joins:
             joined_table = join['table']
             condition = join['condition']
             
+            # The same condition record is shared by every table of the report
+            join_condition = {
+                'with': joined_table,
+                'condition': condition,
+                'report': report_name
+            }
+            
             for table in tables:
                 if table != joined_table:
-                    table_joins[table]['joins_with'].add(joined_table)
-                    table_joins[table]['join_conditions'].append({
-                        'with': joined_table,
-                        'condition': condition,
-                        'report': analysis['report_name']
-                    })
-                    table_joins[table]['usage_count'] += 1
+                    entry = table_joins[table]
+                    entry['joins_with'].add(joined_table)
+                    entry['join_conditions'].append(join_condition)
+                    entry['usage_count'] += 1
+        
+        for agg in aggregations:
+            bucket = AGGREGATION_BUCKETS.get(agg['function'])
+            if bucket is None:
+                continue
+            expr = agg['expression'].lower()[:50]
+            for table in tables:
+                agg_by_table[table][bucket][expr] += 1
+        
+        for filter_cond in analysis['filters']:
+            col = filter_cond['column']
+            ftype = filter_cond['type']
+            if ftype == 'equality':
+                bucket = 'equality_filters'
+            elif 'date' in col.lower():
+                bucket = 'date_filters'
+            elif 'null' in ftype:
+                bucket = 'null_checks'
+            else:
+                continue
+            for table in tables:
+                filter_by_table[table][bucket][col] += 1
+    
+    # 1. Build comprehensive table relationships
+    print("\n[1] Building table relationship knowledge...")
     
     # Convert sets to lists for JSON serialization
     for table, data in table_joins.items():
@@ -66,116 +141,28 @@ def build_comprehensive_knowledge():
     
     # 2. Extract common query patterns
     print("\n[2] Extracting common query patterns...")
-    query_patterns = {
-        'customer_loan_amount': [],
-        'product_disbursement': [],
-        'branch_collection': [],
-        'outstanding_report': [],
-        'par_npa_report': []
-    }
-    
-    for analysis in deep_analysis:
-        report_name = analysis['report_name'].lower()
-        
-        # Customer + Loan Amount pattern
-        if 'customer' in report_name and ('outstanding' in report_name or 'loan' in report_name):
-            query_patterns['customer_loan_amount'].append({
-                'report': analysis['report_name'],
-                'tables': [t[0] for t in analysis['tables']],
-                'joins': analysis['joins'],
-                'aggregations': analysis['aggregations']
-            })
-        
-        # Product + Disbursement pattern
-        if 'product' in report_name or 'disbursement' in report_name:
-            query_patterns['product_disbursement'].append({
-                'report': analysis['report_name'],
-                'tables': [t[0] for t in analysis['tables']],
-                'joins': analysis['joins'],
-                'aggregations': analysis['aggregations']
-            })
-        
-        # Branch + Collection pattern
-        if 'branch' in report_name or 'collection' in report_name:
-            query_patterns['branch_collection'].append({
-                'report': analysis['report_name'],
-                'tables': [t[0] for t in analysis['tables']],
-                'joins': analysis['joins'],
-                'aggregations': analysis['aggregations']
-            })
-        
-        # Outstanding pattern
-        if 'outstanding' in report_name or 'portfolio' in report_name:
-            query_patterns['outstanding_report'].append({
-                'report': analysis['report_name'],
-                'tables': [t[0] for t in analysis['tables']],
-                'joins': analysis['joins'],
-                'aggregations': analysis['aggregations']
-            })
-        
-        # PAR/NPA pattern
-        if 'par' in report_name or 'npa' in report_name:
-            query_patterns['par_npa_report'].append({
-                'report': analysis['report_name'],
-                'tables': [t[0] for t in analysis['tables']],
-                'joins': analysis['joins'],
-                'aggregations': analysis['aggregations']
-            })
-    
     knowledge['common_queries'] = query_patterns
     for pattern_type, patterns in query_patterns.items():
         print(f"   {pattern_type}: {len(patterns)} examples")
     
     # 3. Aggregation patterns
     print("\n[3] Learning aggregation patterns...")
-    agg_by_table = defaultdict(lambda: {'sum_columns': set(), 'count_columns': set(), 'max_columns': set()})
-    
-    for analysis in deep_analysis:
-        tables = [t[0] for t in analysis['tables']]
-        for agg in analysis['aggregations']:
-            func = agg['function']
-            expr = agg['expression'].lower()
-            
-            for table in tables:
-                if func == 'SUM':
-                    agg_by_table[table]['sum_columns'].add(expr[:50])
-                elif func == 'COUNT':
-                    agg_by_table[table]['count_columns'].add(expr[:50])
-                elif func == 'MAX':
-                    agg_by_table[table]['max_columns'].add(expr[:50])
-    
     for table, aggs in agg_by_table.items():
         knowledge['aggregation_patterns'][table] = {
-            'sum_columns': list(aggs['sum_columns'])[:5],
-            'count_columns': list(aggs['count_columns'])[:5],
-            'max_columns': list(aggs['max_columns'])[:5]
+            'sum_columns': most_common(aggs['sum_columns'], 5),
+            'count_columns': most_common(aggs['count_columns'], 5),
+            'max_columns': most_common(aggs['max_columns'], 5)
         }
     
     print(f"   Learned aggregation patterns for {len(knowledge['aggregation_patterns'])} tables")
     
     # 4. Filter patterns
     print("\n[4] Learning filter patterns...")
-    filter_by_table = defaultdict(lambda: {'equality_filters': set(), 'date_filters': set(), 'null_checks': set()})
-    
-    for analysis in deep_analysis:
-        tables = [t[0] for t in analysis['tables']]
-        for filter_cond in analysis['filters']:
-            col = filter_cond['column']
-            ftype = filter_cond['type']
-            
-            for table in tables:
-                if ftype == 'equality':
-                    filter_by_table[table]['equality_filters'].add(col)
-                elif 'date' in col.lower():
-                    filter_by_table[table]['date_filters'].add(col)
-                elif 'null' in ftype:
-                    filter_by_table[table]['null_checks'].add(col)
-    
     for table, filters in filter_by_table.items():
         knowledge['filter_patterns'][table] = {
-            'common_equality_filters': list(filters['equality_filters'])[:5],
-            'date_filters': list(filters['date_filters'])[:5],
-            'null_checks': list(filters['null_checks'])[:3]
+            'common_equality_filters': most_common(filters['equality_filters'], 5),
+            'date_filters': most_common(filters['date_filters'], 5),
+            'null_checks': most_common(filters['null_checks'], 3)
         }
     
     print(f"   Learned filter patterns for {len(knowledge['filter_patterns'])} tables")
@@ -249,8 +236,8 @@ def build_comprehensive_knowledge():
     print(f"   Documented {len(knowledge['business_rules'])} business rules")
     
     # Save comprehensive knowledge
-    with open('ai_comprehensive_knowledge.json', 'w', encoding='utf-8') as f:
-        json.dump(knowledge, f, indent=2, ensure_ascii=False, default=str)
+    with open('ai_comprehensive_knowledge.json', 'wb') as f:
+        f.write(orjson.dumps(knowledge, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     
     print("\n" + "="*80)
     print("[SUCCESS] Comprehensive knowledge base created!")
@@ -262,9 +249,6 @@ def build_comprehensive_knowledge():
 def generate_ai_prompt_guide():
     """Generate a comprehensive guide for the AI agent"""
     
-    with open('ai_comprehensive_knowledge.json', 'r', encoding='utf-8') as f:
-        knowledge = json.load(f)
-    
     guide = """
 # COMPREHENSIVE AI AGENT KNOWLEDGE BASE
 # Auto-generated from 274 production reports
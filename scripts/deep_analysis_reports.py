@@ -6,9 +6,16 @@ Comprehensive understanding of business logic, joins, aggregations, and patterns
 import mysql.connector
 from dotenv import load_dotenv
 import os
-import json
+import hashlib
+import heapq
+import multiprocessing
 import re
-from collections import defaultdict
+import sqlite3
+import sys
+import threading
+import orjson
+from collections import Counter
+from report_source import count_reports, iter_reports, normalize_sql
 
 load_dotenv()
 
@@ -20,84 +27,125 @@ DB_CONFIG = {
     'database': os.getenv('MYSQL_DATABASE')
 }
 
+# Report-name keywords -> report type, in priority order
+REPORT_TYPE_RULES = (
+    (('collection',), 'Type: Collections/Repayment Report'),
+    (('disbursement',), 'Type: Disbursement Report'),
+    (('portfolio', 'outstanding'), 'Type: Portfolio/Outstanding Report'),
+    (('par', 'npa'), 'Type: Asset Quality Report'),
+    (('customer',), 'Type: Customer Report'),
+    (('loan',), 'Type: Loan Report')
+)
+
+# Worker processes for report analysis; consecutive reports (often clones) go to a worker together
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', os.cpu_count() or 1))
+ANALYSIS_CHUNK_SIZE = 32
+
+# Structure analyses kept between runs (see AnalysisCache)
+ANALYSIS_CACHE_FILE = 'analysis_cache.sqlite'
+
+DETAILED_ANALYSIS_FILE = 'reports_deep_analysis.json'
+
+# Patterns are compiled once here rather than looked up per call - analysis runs them for every report
+_FROM_RE = re.compile(r'FROM\s+(\w+\.?\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_JOIN_RE = re.compile(r'JOIN\s+(\w+\.?\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+_JOIN_DETAIL_RE = re.compile(
+    r'((?:INNER|LEFT|RIGHT|OUTER)?\s*JOIN)\s+(\w+\.?\w+)(?:\s+(?:AS\s+)?(\w+))?\s+ON\s+([^\n;]+?)(?=(?:INNER|LEFT|RIGHT|JOIN|WHERE|GROUP|ORDER|HAVING|LIMIT|$))',
+    re.IGNORECASE | re.DOTALL
+)
+_SELECT_RE = re.compile(r'SELECT\s+(.*?)\s+FROM', re.IGNORECASE | re.DOTALL)
+_SELECT_SPLIT_RE = re.compile(r',(?![^()]*\))')
+_COLUMN_ALIAS_RE = re.compile(r'(?:AS\s+)?(\w+)\s*$', re.IGNORECASE)
+_COLUMN_NAME_RE = re.compile(r'(\w+\.)?(\w+)')
+_AGG_RE = re.compile(r'(SUM|COUNT|AVG|MAX|MIN|GROUP_CONCAT)\s*\([^)]+\)(?:\s+AS\s+(\w+))?', re.IGNORECASE)
+_WHERE_RE = re.compile(r'WHERE\s+(.*?)(?=GROUP BY|HAVING|ORDER BY|LIMIT|$)', re.IGNORECASE | re.DOTALL)
+_GB_RE = re.compile(r'GROUP\s+BY\s+(.*?)(?=HAVING|ORDER BY|LIMIT|$)', re.IGNORECASE | re.DOTALL)
+_OB_RE = re.compile(r'ORDER\s+BY\s+(.*?)(?=LIMIT|$)', re.IGNORECASE | re.DOTALL)
+
+# WHERE condition shapes, in the order their matches are reported - each is scanned on its own,
+# so a condition inside another's match (e.g. "col = x" within a BETWEEN) is still found
+_WHERE_PATTERNS = tuple(
+    (re.compile(pattern, re.IGNORECASE), condition_type)
+    for pattern, condition_type in (
+        (r'(\w+\.?\w+)\s*=\s*', 'equality'),
+        (r'(\w+\.?\w+)\s+IN\s*\(', 'in_list'),
+        (r'(\w+\.?\w+)\s+LIKE\s+', 'like'),
+        (r'(\w+\.?\w+)\s+BETWEEN\s+', 'between'),
+        (r'(\w+\.?\w+)\s+IS\s+NULL', 'is_null'),
+        (r'(\w+\.?\w+)\s+IS\s+NOT\s+NULL', 'is_not_null'),
+        (r'(\w+\.?\w+)\s*>\s*', 'greater_than'),
+        (r'(\w+\.?\w+)\s*<\s*', 'less_than')
+    )
+)
+MAX_FILTERS = 20
+
+def identifier(name):
+    """Lower-cased, interned name - tables and columns repeat across reports, so each is stored (and pickled) once"""
+    return sys.intern(name.lower())
+
 class SQLAnalyzer:
     """Deep SQL query analyzer"""
     
     def __init__(self):
-        self.table_usage = defaultdict(lambda: {
-            'select_count': 0,
-            'join_count': 0,
-            'where_count': 0,
-            'group_by_count': 0,
-            'columns_used': set(),
-            'joined_with': set(),
-            'common_filters': [],
-            'aggregations': []
-        })
-        
-        self.join_patterns = defaultdict(list)
-        self.aggregation_patterns = []
-        self.business_patterns = defaultdict(list)
-    
-    def analyze_query(self, report_name, query):
-        """Comprehensive query analysis"""
-        result = {
-            'report_name': report_name,
-            'tables': [],
-            'joins': [],
-            'columns': [],
-            'aggregations': [],
-            'filters': [],
-            'group_by': [],
-            'order_by': [],
-            'business_logic': []
-        }
-        
-        query_upper = query.upper()
-        
-        # Extract tables from FROM and JOIN
-        result['tables'] = self.extract_tables(query)
-        
-        # Extract JOIN conditions
-        result['joins'] = self.extract_joins(query)
-        
-        # Extract columns being selected
-        result['columns'] = self.extract_select_columns(query)
-        
-        # Extract aggregations (SUM, COUNT, AVG, MAX, MIN)
-        result['aggregations'] = self.extract_aggregations(query)
-        
-        # Extract WHERE conditions
-        result['filters'] = self.extract_where_conditions(query)
-        
-        # Extract GROUP BY
-        result['group_by'] = self.extract_group_by(query)
-        
-        # Extract ORDER BY
-        result['order_by'] = self.extract_order_by(query)
-        
-        # Infer business logic
+        # query -> analyze_structure() result
+        self._structure_cache = {}
+    
+    def analyze_query(self, report_name, query, structure=None):
+        """
+        Comprehensive query analysis
+        structure: analyze_structure() result for this query from an earlier run, if known
+        """
+        # Cloned reports share their SQL - parse each distinct query once
+        if structure is None:
+            structure = self._structure_cache.get(query)
+        if structure is None:
+            structure = self.analyze_structure(query)
+            self._structure_cache[query] = structure
+        
+        result = {'report_name': report_name, **structure}
+        
+        # Infer business logic (depends on the report name, so never cached)
         result['business_logic'] = self.infer_business_logic(report_name, query, result)
         
         return result
     
+    def analyze_structure(self, query):
+        """Tables, joins, columns, aggregations, filters and grouping/ordering of one query"""
+        # Commented-out SQL must not count, and `schema`.`table` must match like schema.table
+        query = normalize_sql(query)
+        
+        return {
+            # Extract tables from FROM and JOIN
+            'tables': self.extract_tables(query),
+            # Extract JOIN conditions
+            'joins': self.extract_joins(query),
+            # Extract columns being selected
+            'columns': self.extract_select_columns(query),
+            # Extract aggregations (SUM, COUNT, AVG, MAX, MIN)
+            'aggregations': self.extract_aggregations(query),
+            # Extract WHERE conditions
+            'filters': self.extract_where_conditions(query),
+            # Extract GROUP BY
+            'group_by': self.extract_group_by(query),
+            # Extract ORDER BY
+            'order_by': self.extract_order_by(query)
+        }
+    
     def extract_tables(self, query):
         """Extract all tables mentioned in query"""
         tables = set()
         
         # FROM clause
-        from_pattern = r'FROM\s+(\w+\.?\w+)(?:\s+(?:AS\s+)?(\w+))?'
-        for match in re.finditer(from_pattern, query, re.IGNORECASE):
+        for match in _FROM_RE.finditer(query):
             table = match.group(1)
             alias = match.group(2)
-            tables.add((table.lower(), alias.lower() if alias else None))
+            tables.add((identifier(table), identifier(alias) if alias else None))
         
         # JOIN clauses
-        join_pattern = r'JOIN\s+(\w+\.?\w+)(?:\s+(?:AS\s+)?(\w+))?'
-        for match in re.finditer(join_pattern, query, re.IGNORECASE):
+        for match in _JOIN_RE.finditer(query):
             table = match.group(1)
             alias = match.group(2)
-            tables.add((table.lower(), alias.lower() if alias else None))
+            tables.add((identifier(table), identifier(alias) if alias else None))
         
         return list(tables)
     
@@ -106,9 +154,7 @@ class SQLAnalyzer:
         joins = []
         
         # Pattern: JOIN table ON condition
-        pattern = r'((?:INNER|LEFT|RIGHT|OUTER)?\s*JOIN)\s+(\w+\.?\w+)(?:\s+(?:AS\s+)?(\w+))?\s+ON\s+([^\n;]+?)(?=(?:INNER|LEFT|RIGHT|JOIN|WHERE|GROUP|ORDER|HAVING|LIMIT|$))'
-        
-        for match in re.finditer(pattern, query, re.IGNORECASE | re.DOTALL):
+        for match in _JOIN_DETAIL_RE.finditer(query):
             join_type = match.group(1).strip()
             table = match.group(2)
             alias = match.group(3)
@@ -116,8 +162,8 @@ class SQLAnalyzer:
             
             joins.append({
                 'type': join_type,
-                'table': table.lower(),
-                'alias': alias.lower() if alias else None,
+                'table': identifier(table),
+                'alias': identifier(alias) if alias else None,
                 'condition': condition[:200]  # Limit length
             })
         
@@ -128,23 +174,23 @@ class SQLAnalyzer:
         columns = []
         
         # Find SELECT clause
-        select_match = re.search(r'SELECT\s+(.*?)\s+FROM', query, re.IGNORECASE | re.DOTALL)
+        select_match = _SELECT_RE.search(query)
         if select_match:
             select_clause = select_match.group(1)
             
             # Split by comma (rough parsing)
-            parts = re.split(r',(?![^()]*\))', select_clause)
+            parts = _SELECT_SPLIT_RE.split(select_clause)
             
             for part in parts[:50]:  # Limit to first 50 columns
                 part = part.strip()
                 if part:
                     # Extract alias if present
-                    as_match = re.search(r'(?:AS\s+)?(\w+)\s*$', part, re.IGNORECASE)
+                    as_match = _COLUMN_ALIAS_RE.search(part)
                     if as_match:
                         col_name = as_match.group(1)
                     else:
                         # Try to get column name
-                        col_match = re.search(r'(\w+\.)?(\w+)', part)
+                        col_match = _COLUMN_NAME_RE.search(part)
                         if col_match:
                             col_name = col_match.group(2)
                         else:
@@ -152,7 +198,7 @@ class SQLAnalyzer:
                     
                     columns.append({
                         'expression': part[:100],
-                        'name': col_name.lower()
+                        'name': identifier(col_name)
                     })
         
         return columns
@@ -161,9 +207,7 @@ class SQLAnalyzer:
         """Extract aggregation functions"""
         aggregations = []
         
-        agg_pattern = r'(SUM|COUNT|AVG|MAX|MIN|GROUP_CONCAT)\s*\([^)]+\)(?:\s+AS\s+(\w+))?'
-        
-        for match in re.finditer(agg_pattern, query, re.IGNORECASE):
+        for match in _AGG_RE.finditer(query):
             func = match.group(1).upper()
             alias = match.group(2)
             full_expr = match.group(0)
@@ -171,7 +215,7 @@ class SQLAnalyzer:
             aggregations.append({
                 'function': func,
                 'expression': full_expr[:100],
-                'alias': alias.lower() if alias else None
+                'alias': identifier(alias) if alias else None
             })
         
         return aggregations
@@ -181,38 +225,28 @@ class SQLAnalyzer:
         filters = []
         
         # Find WHERE clause
-        where_match = re.search(r'WHERE\s+(.*?)(?=GROUP BY|HAVING|ORDER BY|LIMIT|$)', query, re.IGNORECASE | re.DOTALL)
+        where_match = _WHERE_RE.search(query)
         if where_match:
             where_clause = where_match.group(1).strip()
             
             # Extract conditions (simplified)
-            # Look for common patterns
-            patterns = [
-                (r'(\w+\.?\w+)\s*=\s*', 'equality'),
-                (r'(\w+\.?\w+)\s+IN\s*\(', 'in_list'),
-                (r'(\w+\.?\w+)\s+LIKE\s+', 'like'),
-                (r'(\w+\.?\w+)\s+BETWEEN\s+', 'between'),
-                (r'(\w+\.?\w+)\s+IS\s+NULL', 'is_null'),
-                (r'(\w+\.?\w+)\s+IS\s+NOT\s+NULL', 'is_not_null'),
-                (r'(\w+\.?\w+)\s*>\s*', 'greater_than'),
-                (r'(\w+\.?\w+)\s*<\s*', 'less_than')
-            ]
-            
-            for pattern, condition_type in patterns:
-                for match in re.finditer(pattern, where_clause, re.IGNORECASE):
-                    column = match.group(1)
+            # Look for common patterns, type by type - scanning stops once MAX_FILTERS are found
+            for pattern, condition_type in _WHERE_PATTERNS:
+                for match in pattern.finditer(where_clause):
                     filters.append({
-                        'column': column.lower(),
+                        'column': identifier(match.group(1)),
                         'type': condition_type
                     })
+                    if len(filters) == MAX_FILTERS:  # Limit
+                        return filters
         
-        return filters[:20]  # Limit
+        return filters
     
     def extract_group_by(self, query):
         """Extract GROUP BY columns"""
         group_by = []
         
-        gb_match = re.search(r'GROUP\s+BY\s+(.*?)(?=HAVING|ORDER BY|LIMIT|$)', query, re.IGNORECASE | re.DOTALL)
+        gb_match = _GB_RE.search(query)
         if gb_match:
             gb_clause = gb_match.group(1).strip()
             parts = [p.strip() for p in gb_clause.split(',')]
@@ -224,7 +258,7 @@ class SQLAnalyzer:
         """Extract ORDER BY columns"""
         order_by = []
         
-        ob_match = re.search(r'ORDER\s+BY\s+(.*?)(?=LIMIT|$)', query, re.IGNORECASE | re.DOTALL)
+        ob_match = _OB_RE.search(query)
         if ob_match:
             ob_clause = ob_match.group(1).strip()
             parts = [p.strip() for p in ob_clause.split(',')]
@@ -237,54 +271,132 @@ class SQLAnalyzer:
         logic = []
         
         report_lower = report_name.lower()
-        query_lower = query.lower()
-        
-        # Identify report type
-        if 'collection' in report_lower:
-            logic.append('Type: Collections/Repayment Report')
-        elif 'disbursement' in report_lower:
-            logic.append('Type: Disbursement Report')
-        elif 'portfolio' in report_lower or 'outstanding' in report_lower:
-            logic.append('Type: Portfolio/Outstanding Report')
-        elif 'par' in report_lower or 'npa' in report_lower:
-            logic.append('Type: Asset Quality Report')
-        elif 'customer' in report_lower:
-            logic.append('Type: Customer Report')
-        elif 'loan' in report_lower:
-            logic.append('Type: Loan Report')
-        
-        # Check for common calculations
-        if any('sum' in a['function'].lower() for a in analysis['aggregations']):
+        
+        # Identify report type (first matching rule wins)
+        for keywords, report_type in REPORT_TYPE_RULES:
+            if any(keyword in report_lower for keyword in keywords):
+                logic.append(report_type)
+                break
+        
+        # Check for common calculations (function names are upper-cased by extract_aggregations)
+        functions = {a['function'] for a in analysis['aggregations']}
+        if 'SUM' in functions:
             logic.append('Calculation: Aggregating amounts (SUM)')
         
-        if any('count' in a['function'].lower() for a in analysis['aggregations']):
+        if 'COUNT' in functions:
             logic.append('Calculation: Counting records')
         
+        # Each list is scanned as one newline-joined string - no keyword contains a newline,
+        # so a keyword is found in the text exactly when it is in one of the items
+        filter_columns = '\n'.join(f.get('column', '') for f in analysis['filters'])
+        group_by = '\n'.join(analysis['group_by']).lower()
+        tables = '\n'.join(t[0] for t in analysis['tables'])
+        
         # Check for date filters
-        if any('date' in f.get('column', '') for f in analysis['filters']):
+        if 'date' in filter_columns:
             logic.append('Filter: Date-based filtering')
         
         # Check for branch/region grouping
-        if any('branch' in gb.lower() for gb in analysis['group_by']):
+        if 'branch' in group_by:
             logic.append('Grouping: Branch-wise analysis')
         
-        if any('product' in gb.lower() for gb in analysis['group_by']):
+        if 'product' in group_by:
             logic.append('Grouping: Product-wise analysis')
         
         # Check for customer joins
-        customer_tables = [t for t in analysis['tables'] if 'customer' in t[0]]
-        if customer_tables:
+        if 'customer' in tables:
             logic.append('Scope: Customer-level data')
         
         # Check for account joins
-        account_tables = [t for t in analysis['tables'] if 'account' in t[0] or 'loan' in t[0]]
-        if account_tables:
+        if 'account' in tables or 'loan' in tables:
             logic.append('Scope: Account/Loan-level data')
         
         return logic
 
+class AnalysisCache:
+    """analyze_structure() results of earlier runs in SQLite, keyed by query hash (emptied when this script changes)"""
+    
+    def __init__(self, path, batch_size=500):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.batch_size = batch_size
+        self.pending = []
+        # Lookups come from the pool's task feeder thread, inserts from the result loop
+        self.lock = threading.Lock()
+        
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (version TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS analysis (key BLOB PRIMARY KEY, structure BLOB NOT NULL)")
+        
+        # Results of a different analyzer version may not match what this one produces
+        version = script_version()
+        row = self.conn.execute("SELECT version FROM meta").fetchone()
+        if row is None or row[0] != version:
+            self.conn.execute("DELETE FROM analysis")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.execute("INSERT INTO meta (version) VALUES (?)", (version,))
+        self.conn.commit()
+    
+    @staticmethod
+    def _key(query):
+        return hashlib.sha256(query.encode('utf-8')).digest()
+    
+    def get(self, query):
+        """Cached structure of a query, or None"""
+        with self.lock:
+            row = self.conn.execute("SELECT structure FROM analysis WHERE key = ?", (self._key(query),)).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def add(self, query, analysis):
+        """Remember the report-independent part of an analysis (inserted in batches)"""
+        structure = {key: value for key, value in analysis.items() if key not in ('report_name', 'business_logic')}
+        with self.lock:
+            self.pending.append((self._key(query), orjson.dumps(structure)))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+    
+    def _flush(self):
+        """Write pending entries (caller holds the lock)"""
+        self.conn.executemany("INSERT OR REPLACE INTO analysis (key, structure) VALUES (?, ?)", self.pending)
+        self.conn.commit()
+        self.pending = []
+    
+    def close(self):
+        with self.lock:
+            if self.pending:
+                self._flush()
+            self.conn.close()
+
+def script_version():
+    """Hash of this script and report_source (normalize_sql) - any change to the analyzer invalidates cached analyses"""
+    digest = hashlib.sha256()
+    for path in (__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_source.py')):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+# Analyzer of the current pool worker (its duplicate-query cache lives as long as the worker)
+_worker_analyzer = None
+
+def _init_worker():
+    """Pool initializer: one SQLAnalyzer per worker process"""
+    global _worker_analyzer
+    _worker_analyzer = SQLAnalyzer()
+
+def _analyze_report(task):
+    """
+    Pool task for one (report, cached structure or None).
+    Returns (analysis, error message, query if it was parsed rather than taken from the cache)
+    """
+    report, structure = task
+    try:
+        analysis = _worker_analyzer.analyze_query(report['report_name'], report['query'], structure)
+    except Exception as e:
+        return None, f"Error analyzing {report['report_name']}: {e}", None
+    return analysis, None, report['query'] if structure is None else None
+
 def deep_analyze_all_reports():
-    """Perform deep analysis on all reports"""
+    """Perform deep analysis on all reports (returns the ReportInsights)"""
     
     print("="*80)
     print("DEEP ANALYSIS OF ALL REPORTS")
@@ -292,116 +404,156 @@ def deep_analyze_all_reports():
     
     # Connect and get reports
     conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
+    total = count_reports(conn)
     
-    cursor.execute("""
-        SELECT id, report_name, query 
-        FROM bi.report_master 
-        WHERE query IS NOT NULL AND query != ''
-        ORDER BY id
-    """)
+    print(f"\nAnalyzing {total} reports...\n")
     
-    reports = cursor.fetchall()
-    conn.close()
+    insights = ReportInsights()
     
-    print(f"\nAnalyzing {len(reports)} reports...\n")
+    # Streamed: reports are analyzed as they arrive instead of loading every query text first
+    reports = iter_reports(conn)
     
-    analyzer = SQLAnalyzer()
-    detailed_analysis = []
+    # Queries analyzed by an earlier run are not parsed again
+    cache = AnalysisCache(ANALYSIS_CACHE_FILE)
+    tasks = ((report, cache.get(report['query'])) for report in reports)
     
-    for i, report in enumerate(reports, 1):
-        if i % 20 == 0:
-            print(f"Progress: {i}/{len(reports)} reports analyzed...")
-        
-        try:
-            analysis = analyzer.analyze_query(report['report_name'], report['query'])
-            detailed_analysis.append(analysis)
-        except Exception as e:
-            print(f"Error analyzing {report['report_name']}: {e}")
-            continue
+    # Each analysis is written out as it completes and only its statistics are kept;
+    # the previous file is replaced once the new one is complete
+    temp_file = DETAILED_ANALYSIS_FILE + '.tmp'
     
-    # Save detailed analysis
-    with open('reports_deep_analysis.json', 'w', encoding='utf-8') as f:
-        json.dump(detailed_analysis, f, indent=2, ensure_ascii=False, default=str)
+    # Reports are independent and parsing is pure CPU - spread it over processes, keeping report order
+    try:
+        with open(temp_file, 'wb') as out, \
+                multiprocessing.Pool(ANALYSIS_WORKERS, initializer=_init_worker) as pool:
+            separator = b'[\n  '
+            results = pool.imap(_analyze_report, tasks, chunksize=ANALYSIS_CHUNK_SIZE)
+            for i, (analysis, error, parsed_query) in enumerate(results, 1):
+                if i % 20 == 0:
+                    print(f"Progress: {i}/{total} reports analyzed...")
+                
+                if error:
+                    print(error)
+                    continue
+                
+                # Same layout as dumping the whole list with OPT_INDENT_2: each record nested one level
+                # (JSON strings never contain a raw newline, so only structural lines are indented)
+                record = orjson.dumps(analysis, default=str, option=orjson.OPT_INDENT_2)
+                out.write(separator + record.replace(b'\n', b'\n  '))
+                separator = b',\n  '
+                
+                insights.add(analysis)
+                if parsed_query is not None:
+                    cache.add(parsed_query, analysis)
+            
+            out.write(b'\n]' if insights.total else b'[]')
+    finally:
+        cache.close()
+        conn.close()
+    
+    os.replace(temp_file, DETAILED_ANALYSIS_FILE)
     
-    print(f"\n[SUCCESS] Analyzed {len(detailed_analysis)} reports")
-    print(f"[SUCCESS] Saved to: reports_deep_analysis.json")
+    print(f"\n[SUCCESS] Analyzed {insights.total} reports")
+    print(f"[SUCCESS] Saved to: {DETAILED_ANALYSIS_FILE}")
     
     # Generate insights
-    generate_insights(detailed_analysis)
+    generate_insights(insights)
     
-    return detailed_analysis
+    return insights
 
-def generate_insights(analysis_list):
+class ReportInsights:
+    """Running statistics over report analyses, so the analyses themselves need not be kept"""
+    
+    COMPLEX_REPORTS = 5
+    
+    def __init__(self):
+        self.total = 0
+        self.table_counts = Counter()
+        self.agg_counts = Counter()
+        self.logic_counts = Counter()
+        self.join_total = 0
+        self.max_joins = 0
+        # Min-heap of (JOIN count, -position, report name) - the most complex reports, earliest first on ties
+        self._complex = []
+    
+    def add(self, analysis):
+        """Count one report's tables, aggregations, business logic and JOINs"""
+        self.table_counts.update(table for table, alias in analysis['tables'])
+        self.agg_counts.update(agg['function'] for agg in analysis['aggregations'])
+        self.logic_counts.update(analysis['business_logic'])
+        
+        join_count = len(analysis['joins'])
+        self.join_total += join_count
+        self.max_joins = max(self.max_joins, join_count)
+        
+        entry = (join_count, -self.total, analysis['report_name'])
+        if len(self._complex) < self.COMPLEX_REPORTS:
+            heapq.heappush(self._complex, entry)
+        else:
+            heapq.heappushpop(self._complex, entry)
+        
+        self.total += 1
+    
+    def complex_reports(self):
+        """[(report name, JOIN count)] of the most complex reports, most JOINs first"""
+        return [(name, join_count) for join_count, _, name in sorted(self._complex, reverse=True)]
+
+def generate_insights(insights):
     """Generate actionable insights from analysis"""
     
     print("\n" + "="*80)
     print("KEY INSIGHTS FROM ANALYSIS")
     print("="*80)
     
-    # Table usage statistics
-    table_counts = defaultdict(int)
-    for analysis in analysis_list:
-        for table, alias in analysis['tables']:
-            table_counts[table] += 1
+    # Only the top entries are shown/saved - most_common(n) selects them without sorting everything
+    top_tables = insights.table_counts.most_common(30)
+    top_logic = insights.logic_counts.most_common(20)
     
+    # Table usage statistics
     print("\n[1] MOST USED TABLES (Top 20):")
-    for table, count in sorted(table_counts.items(), key=lambda x: x[1], reverse=True)[:20]:
+    for table, count in top_tables[:20]:
         print(f"   {table}: {count} reports")
     
     # Common aggregations
-    agg_counts = defaultdict(int)
-    for analysis in analysis_list:
-        for agg in analysis['aggregations']:
-            agg_counts[agg['function']] += 1
-    
     print("\n[2] AGGREGATION USAGE:")
-    for func, count in sorted(agg_counts.items(), key=lambda x: x[1], reverse=True):
+    for func, count in insights.agg_counts.most_common():
         print(f"   {func}: {count} times")
     
     # Business logic patterns
-    logic_counts = defaultdict(int)
-    for analysis in analysis_list:
-        for logic in analysis['business_logic']:
-            logic_counts[logic] += 1
-    
     print("\n[3] BUSINESS LOGIC PATTERNS (Top 15):")
-    for logic, count in sorted(logic_counts.items(), key=lambda x: x[1], reverse=True)[:15]:
+    for logic, count in top_logic[:15]:
         print(f"   {logic}: {count} reports")
     
     # JOIN complexity
-    join_counts = [len(a['joins']) for a in analysis_list]
-    avg_joins = sum(join_counts) / len(join_counts) if join_counts else 0
-    max_joins = max(join_counts) if join_counts else 0
+    avg_joins = insights.join_total / insights.total if insights.total else 0
+    max_joins = insights.max_joins
     
     print(f"\n[4] JOIN COMPLEXITY:")
     print(f"   Average JOINs per report: {avg_joins:.1f}")
     print(f"   Maximum JOINs in a report: {max_joins}")
     
     # Most complex reports
-    complex_reports = sorted(analysis_list, key=lambda x: len(x['joins']), reverse=True)[:5]
     print(f"\n[5] MOST COMPLEX REPORTS (by JOIN count):")
-    for report in complex_reports:
-        print(f"   {report['report_name']}: {len(report['joins'])} JOINs")
+    for report_name, join_count in insights.complex_reports():
+        print(f"   {report_name}: {join_count} JOINs")
     
     # Save summary
     summary = {
-        'total_reports': len(analysis_list),
-        'most_used_tables': dict(sorted(table_counts.items(), key=lambda x: x[1], reverse=True)[:30]),
-        'aggregation_usage': dict(agg_counts),
-        'business_patterns': dict(sorted(logic_counts.items(), key=lambda x: x[1], reverse=True)[:20]),
+        'total_reports': insights.total,
+        'most_used_tables': dict(top_tables),
+        'aggregation_usage': dict(insights.agg_counts),
+        'business_patterns': dict(top_logic),
         'avg_joins_per_report': avg_joins,
         'max_joins': max_joins
     }
     
-    with open('reports_analysis_summary.json', 'w', encoding='utf-8') as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
+    with open('reports_analysis_summary.json', 'wb') as f:
+        f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
     
     print(f"\n[SUCCESS] Summary saved to: reports_analysis_summary.json")
 
 if __name__ == "__main__":
     try:
-        analysis = deep_analyze_all_reports()
+        insights = deep_analyze_all_reports()
         print("\n" + "="*80)
         print("DEEP ANALYSIS COMPLETE!")
         print("="*80)
@@ -5,8 +5,10 @@ Extract queries from bi.report_master to learn join patterns
 import mysql.connector
 from dotenv import load_dotenv
 import os
-import json
 import re
+import orjson
+from collections import Counter
+from report_source import iter_reports, normalize_sql
 
 load_dotenv()
 
@@ -18,27 +20,26 @@ DB_CONFIG = {
     'database': os.getenv('MYSQL_DATABASE')
 }
 
+# Compiled once - both are run against every report query
+_JOIN_RE = re.compile(
+    r'JOIN\s+(\w+\.?\w+)\s+(?:AS\s+)?(\w+)?\s+ON\s+([^\n;]+?)(?:WHERE|GROUP|ORDER|INNER|LEFT|RIGHT|JOIN|$)',
+    re.IGNORECASE | re.DOTALL
+)
+_SCHEMA_TBL_RE = re.compile(r'\b(\w+)\.(\w+)\b', re.IGNORECASE)
+
 def extract_queries():
     """Extract all queries from bi.report_master"""
     conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
     
     print("Extracting queries from bi.report_master...")
-    cursor.execute("""
-        SELECT id, report_name, query 
-        FROM bi.report_master 
-        WHERE query IS NOT NULL AND query != ''
-        ORDER BY id
-    """)
-    
-    reports = cursor.fetchall()
+    reports = list(iter_reports(conn))
     conn.close()
     
     print(f"Found {len(reports)} reports with queries\n")
     
     # Save raw queries
-    with open('report_queries.json', 'w', encoding='utf-8') as f:
-        json.dump(reports, f, indent=2, ensure_ascii=False)
+    with open('report_queries.json', 'wb') as f:
+        f.write(orjson.dumps(reports, option=orjson.OPT_INDENT_2))
     
     return reports
 
@@ -46,17 +47,13 @@ def parse_joins_from_query(query):
     """Extract JOIN information from a SQL query"""
     joins = []
     
-    # Normalize query
-    query = query.upper()
-    
-    # Find all JOIN patterns
-    join_pattern = r'JOIN\s+(\w+\.?\w+)\s+(?:AS\s+)?(\w+)?\s+ON\s+([^\n;]+?)(?:WHERE|GROUP|ORDER|INNER|LEFT|RIGHT|JOIN|$)'
-    matches = re.finditer(join_pattern, query, re.IGNORECASE | re.DOTALL)
+    # Find all JOIN patterns (case-insensitive, so only the captured parts need normalizing)
+    matches = _JOIN_RE.finditer(query)
     
     for match in matches:
-        table = match.group(1)
-        alias = match.group(2)
-        condition = match.group(3).strip()
+        table = match.group(1).upper()
+        alias = match.group(2).upper() if match.group(2) else None
+        condition = match.group(3).strip().upper()
         
         joins.append({
             'table': table,
@@ -71,8 +68,7 @@ def extract_table_references(query):
     tables = set()
     
     # Find schema.table patterns
-    pattern = r'\b(\w+)\.(\w+)\b'
-    matches = re.finditer(pattern, query, re.IGNORECASE)
+    matches = _SCHEMA_TBL_RE.finditer(query)
     
     for match in matches:
         schema = match.group(1).lower()
@@ -94,7 +90,8 @@ def analyze_queries(reports):
     table_relationships = {}
     
     for report in reports:
-        query = report['query']
+        # Commented-out SQL must not count, and `schema`.`table` must match like schema.table
+        query = normalize_sql(report['query'])
         report_name = report['report_name']
         
         # Extract joins
@@ -136,24 +133,16 @@ def generate_training_data(join_patterns):
     
     for table, patterns in join_patterns.items():
         # Count most common join patterns
-        pattern_counts = {}
-        for p in patterns:
-            condition = p['condition']
-            if condition not in pattern_counts:
-                pattern_counts[condition] = []
-            pattern_counts[condition].append(p['report'])
-        
-        # Get most common patterns
-        sorted_patterns = sorted(pattern_counts.items(), key=lambda x: len(x[1]), reverse=True)
+        pattern_counts = Counter(p['condition'] for p in patterns)
         
         print(f"\n[Table] {table}")
         print(f"   Used in {len(patterns)} queries")
         print("   Common join patterns:")
         
         common_joins = []
-        for condition, reports in sorted_patterns[:3]:
+        for condition, count in pattern_counts.most_common(3):
             print(f"      - {condition}")
-            print(f"        (used in {len(reports)} reports)")
+            print(f"        (used in {count} reports)")
             common_joins.append(f"JOIN {table} ON {condition}")
         
         training_data[table] = {
@@ -166,8 +155,8 @@ def generate_training_data(join_patterns):
 
 def save_training_data(training_data):
     """Save learned patterns"""
-    with open('learned_join_patterns.json', 'w', encoding='utf-8') as f:
-        json.dump(training_data, f, indent=2, ensure_ascii=False)
+    with open('learned_join_patterns.json', 'wb') as f:
+        f.write(orjson.dumps(training_data, option=orjson.OPT_INDENT_2))
     
     print("\n" + "="*80)
     print("✓ Saved learned patterns to: learned_join_patterns.json")
@@ -2,12 +2,12 @@
 Filter SCHEMA_TRAINING.txt to only include encoredb and financialForms schemas
 """
 
-import json
 import os
+import orjson
 
 # Read the full metadata
-with open('schema_metadata.json', 'r', encoding='utf-8') as f:
-    metadata = json.load(f)
+with open('schema_metadata.json', 'rb') as f:
+    metadata = orjson.loads(f.read())
 
 # Filter to only encoredb and financialForms
 filtered_metadata = {
@@ -19,57 +19,69 @@ filtered_metadata = {
 print(f"Original tables: {len(metadata)}")
 print(f"Filtered tables: {len(filtered_metadata)}")
 
-# Create filtered training file
-with open('SCHEMA_TRAINING_FILTERED.txt', 'w', encoding='utf-8') as f:
-    f.write("="*100 + "\n")
-    f.write("LOANLYTICS AI - SCHEMA TRAINING FILE (encoredb & financialForms only)\n")
-    f.write("="*100 + "\n\n")
-    f.write("Instructions: Fill in the descriptions, common_joins, and business_meaning for each table.\n")
-    f.write("This will help the AI understand your database structure and generate accurate queries.\n\n")
+# Fill-in section appended after every table - identical for all tables
+TRAINING_FILL_IN = (
+    "\n"
+    + "="*50 + " FILL IN BELOW " + "="*50 + "\n\n"
+    "DESCRIPTION (what data does this table hold?):\n"
+    "  \n\n"
+    "BUSINESS MEANING (what business entity does this represent?):\n"
+    "  \n\n"
+    "COMMON JOINS (how does it join with other tables?):\n"
+    "  Example: JOIN {other_table} ON {this_table}.{column} = {other_table}.{column}\n"
+    "  \n\n"
+    "\n\n"
+)
+
+# Create filtered training file - assembled in memory and written once
+chunks = [
+    "="*100 + "\n",
+    "LOANLYTICS AI - SCHEMA TRAINING FILE (encoredb & financialForms only)\n",
+    "="*100 + "\n\n",
+    "Instructions: Fill in the descriptions, common_joins, and business_meaning for each table.\n",
+    "This will help the AI understand your database structure and generate accurate queries.\n\n"
+]
+
+for table_name, info in sorted(filtered_metadata.items()):
+    chunks.append(
+        "\n" + "="*100 + "\n"
+        f"TABLE: {table_name}\n"
+        + "="*100 + "\n"
+        f"Schema: {info['schema']}\n"
+        f"Row Count: {info['row_count']:,}\n"
+        f"Current Comment: {info['comment']}\n\n"
+    )
+    
+    # Show key columns
+    chunks.append("KEY COLUMNS:\n")
+    for col in info['columns']:
+        name_lower = col['name'].lower()
+        if col['key'] or 'id' in name_lower or 'code' in name_lower:
+            chunks.append(f"  - {col['name']} ({col['type']}) {col['key']}\n")
     
-    for table_name, info in sorted(filtered_metadata.items()):
-        f.write("\n" + "="*100 + "\n")
-        f.write(f"TABLE: {table_name}\n")
-        f.write("="*100 + "\n")
-        f.write(f"Schema: {info['schema']}\n")
-        f.write(f"Row Count: {info['row_count']:,}\n")
-        f.write(f"Current Comment: {info['comment']}\n\n")
-        
-        # Show key columns
-        f.write("KEY COLUMNS:\n")
-        for col in info['columns']:
-            if col['key'] or 'id' in col['name'].lower() or 'code' in col['name'].lower():
-                f.write(f"  - {col['name']} ({col['type']}) {col['key']}\n")
-        
-        # Show indexes
-        f.write("\nINDEXES:\n")
-        for idx in info['indexes']:
-            unique = "UNIQUE" if idx['unique'] else ""
-            f.write(f"  - {idx['name']} {unique} on ({', '.join(idx['columns'])})\n")
-        
-        # Show foreign keys if any
-        if info['foreign_keys']:
-            f.write("\nFOREIGN KEYS:\n")
-            for fk in info['foreign_keys']:
-                f.write(f"  - {fk['column']} -> {fk['references']}\n")
-        
-        f.write("\n")
-        f.write("="*50 + " FILL IN BELOW " + "="*50 + "\n\n")
-        f.write("DESCRIPTION (what data does this table hold?):\n")
-        f.write("  \n\n")
-        f.write("BUSINESS MEANING (what business entity does this represent?):\n")
-        f.write("  \n\n")
-        f.write("COMMON JOINS (how does it join with other tables?):\n")
-        f.write("  Example: JOIN {other_table} ON {this_table}.{column} = {other_table}.{column}\n")
-        f.write("  \n\n")
-        f.write("\n\n")
+    # Show indexes
+    chunks.append("\nINDEXES:\n")
+    for idx in info['indexes']:
+        unique = "UNIQUE" if idx['unique'] else ""
+        chunks.append(f"  - {idx['name']} {unique} on ({', '.join(idx['columns'])})\n")
+    
+    # Show foreign keys if any
+    if info['foreign_keys']:
+        chunks.append("\nFOREIGN KEYS:\n")
+        for fk in info['foreign_keys']:
+            chunks.append(f"  - {fk['column']} -> {fk['references']}\n")
+    
+    chunks.append(TRAINING_FILL_IN)
+
+with open('SCHEMA_TRAINING_FILTERED.txt', 'w', encoding='utf-8') as f:
+    f.write(''.join(chunks))
 
 print("Filtered training file created: SCHEMA_TRAINING_FILTERED.txt")
 print(f"File size reduced significantly - only {len(filtered_metadata)} tables")
 
 # Also save filtered metadata
-with open('schema_metadata_filtered.json', 'w', encoding='utf-8') as f:
-    json.dump(filtered_metadata, f, indent=2, ensure_ascii=False)
+with open('schema_metadata_filtered.json', 'wb') as f:
+    f.write(orjson.dumps(filtered_metadata, option=orjson.OPT_INDENT_2))
 
 print("Filtered metadata saved: schema_metadata_filtered.json")
 
@@ -0,0 +1,68 @@
+"""
+Report Source
+Reads the analyzable report queries from bi.report_master and normalizes their SQL (shared by the report analysis scripts)
+"""
+
+import os
+import re
+
+# Reports worth analyzing - a query without FROM (blank, comment-only, SELECT 1...) teaches nothing
+REPORT_FILTER = "query IS NOT NULL AND query != '' AND query LIKE '%FROM%'"
+
+# Analyze only the first N reports (quick development runs); 0 means all
+REPORT_LIMIT = int(os.getenv('REPORT_LIMIT', '0'))
+
+# Rows pulled from the server per round trip
+FETCH_BATCH_SIZE = 200
+
+# Comments and `quoted` identifiers, skipping over string literals (group 1) so their contents are never touched
+_SQL_NOISE_RE = re.compile(
+    r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|`([^`]*)`|--(?=\s|$)[^\n]*|\#[^\n]*|/\*.*?\*/""",
+    re.DOTALL
+)
+
+
+def count_reports(conn):
+    """Number of reports iter_reports() will yield"""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"SELECT COUNT(*) AS total FROM bi.report_master WHERE {REPORT_FILTER}")
+    total = cursor.fetchall()[0]['total']
+    cursor.close()
+    return min(total, REPORT_LIMIT) if REPORT_LIMIT > 0 else total
+
+
+def iter_reports(conn, batch_size=FETCH_BATCH_SIZE):
+    """
+    Run the report query and return an iterator of {id, report_name, query} rows in id order.
+    Rows are streamed from an unbuffered cursor, so the connection is busy until the iterator is exhausted.
+    """
+    limit = f"LIMIT {REPORT_LIMIT}" if REPORT_LIMIT > 0 else ""
+    cursor = conn.cursor(dictionary=True, buffered=False)
+    cursor.execute(f"""
+        SELECT id, report_name, query
+        FROM bi.report_master
+        WHERE {REPORT_FILTER}
+        ORDER BY id
+        {limit}
+    """)
+    return _iter_rows(cursor, batch_size)
+
+
+def _iter_rows(cursor, batch_size):
+    """Yield the rows of an executed cursor, fetching batch_size at a time"""
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield from batch
+
+
+def normalize_sql(query):
+    """Drop comments and backtick quoting so the extractors see plain identifiers (string literals are kept)"""
+    def replace(match):
+        if match.group(1) is not None:
+            return match.group(1)
+        if match.group(2) is not None:
+            return match.group(2)
+        return ' '
+    return _SQL_NOISE_RE.sub(replace, query)
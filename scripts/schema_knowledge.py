@@ -5,7 +5,54 @@ Uses trained metadata to generate accurate queries with proper indexes
 
 import json
 import os
-from typing import Dict, List, Optional
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+
+def _build_prefix_trie(indexes: List[Dict]) -> List:
+    """
+    Trie over the index column lists. A node is [first index through it, {column: child node}],
+    so the node reached by walking a column list holds the first index starting with those columns.
+    """
+    root: List = [None, {}]
+    for idx in indexes:
+        node = root
+        if node[0] is None:
+            node[0] = idx
+        for col in idx['columns']:
+            node = node[1].setdefault(col, [None, {}])
+            if node[0] is None:
+                node[0] = idx
+    return root
+
+
+# Tables described in the LLM schema context, in this order
+IMPORTANT_TABLES = (
+    'customers', 'account_holders', 'loan_od_working_registers',
+    'loan_od_disbursements', 'account_profiles', 'loan_od_profiles'
+)
+
+
+class TableLookup:
+    """Lookup structures derived from one table's metadata (slotted - one per looked-up table)"""
+    
+    __slots__ = ('column_names', 'indexed_columns', 'index_sets', 'exact_indexes', 'index_trie', 'fk_targets')
+    
+    def __init__(self, info: Dict):
+        indexes = info.get('indexes', [])
+        self.column_names: FrozenSet[str] = frozenset(col['name'] for col in info['columns'])
+        self.indexed_columns: FrozenSet[str] = frozenset(col for idx in indexes for col in idx['columns'])
+        # [(index column set, index)] and {index column set: first index}
+        self.index_sets: List[Tuple[FrozenSet[str], Dict]] = [(frozenset(idx['columns']), idx) for idx in indexes]
+        self.exact_indexes: Dict[FrozenSet[str], Dict] = {}
+        for idx_set, idx in self.index_sets:
+            self.exact_indexes.setdefault(idx_set, idx)
+        self.index_trie = _build_prefix_trie(indexes)
+        # Foreign keys by referenced table, both "table" and "schema.table" (first key wins) -> (from column, to column)
+        self.fk_targets: Dict[str, Tuple[str, str]] = {}
+        for fk in info.get('foreign_keys', []):
+            ref_schema, ref_table, ref_column = fk['references'].rsplit('.', 2)
+            self.fk_targets.setdefault(ref_table, (fk['column'], ref_column))
+            self.fk_targets.setdefault(f"{ref_schema}.{ref_table}", (fk['column'], ref_column))
 
 
 class SchemaKnowledge:
@@ -13,6 +60,11 @@ class SchemaKnowledge:
     
     def __init__(self, metadata_file='schema_metadata.json'):
         self.metadata = {}
+        # Per-table lookup structures, derived on first lookup of a table and kept until the next load
+        self._table_lookups: Dict[str, TableLookup] = {}
+        # Bare table name -> metadata key (first schema wins, as the old linear search did)
+        self._by_table: Dict[str, str] = {}
+        self._context_cache: Optional['SchemaContext'] = None
         self.load_metadata(metadata_file)
     
     def load_metadata(self, filepath):
@@ -20,22 +72,39 @@ class SchemaKnowledge:
         if os.path.exists(filepath):
             with open(filepath, 'r', encoding='utf-8') as f:
                 self.metadata = json.load(f)
+            self._index_metadata()
+            self._context_cache = None
             print(f"[SCHEMA] Loaded metadata for {len(self.metadata)} tables")
         else:
             print(f"[SCHEMA] Warning: {filepath} not found. Run collect_schema_metadata.py first.")
     
-    def get_table_info(self, table_name: str) -> Optional[Dict]:
-        """Get full metadata for a table"""
+    def _index_metadata(self):
+        """Index table names for _resolve; the per-table structures are left to _table_lookup"""
+        self._table_lookups = {}
+        self._by_table = {}
+        for full_name, info in self.metadata.items():
+            self._by_table.setdefault(info['table'], full_name)
+    
+    def _table_lookup(self, full_name: str) -> TableLookup:
+        """Lookup structures of a table - built on first use, most tables are never looked up"""
+        lookup = self._table_lookups.get(full_name)
+        if lookup is None:
+            lookup = self._table_lookups[full_name] = TableLookup(self.metadata[full_name])
+        return lookup
+    
+    def _resolve(self, table_name: str) -> Optional[str]:
+        """Metadata key for a table given with or without its schema"""
         # Try with schema prefix
         if table_name in self.metadata:
-            return self.metadata[table_name]
-        
-        # Try without schema (search all schemas)
-        for full_name, info in self.metadata.items():
-            if info['table'] == table_name:
-                return info
+            return table_name
         
-        return None
+        # Try without schema (any schema)
+        return self._by_table.get(table_name)
+    
+    def get_table_info(self, table_name: str) -> Optional[Dict]:
+        """Get full metadata for a table"""
+        full_name = self._resolve(table_name)
+        return self.metadata[full_name] if full_name else None
     
     def get_indexes(self, table_name: str) -> List[Dict]:
         """Get all indexes for a table"""
@@ -44,44 +113,56 @@ class SchemaKnowledge:
     
     def get_best_index(self, table_name: str, columns: List[str]) -> Optional[Dict]:
         """Find the best index for given columns"""
-        indexes = self.get_indexes(table_name)
+        full_name = self._resolve(table_name)
+        if not full_name:
+            return None
+        lookup = self._table_lookup(full_name)
+        wanted = frozenset(columns)
         
         # Prefer exact match
-        for idx in indexes:
-            if set(idx['columns']) == set(columns):
-                return idx
+        idx = lookup.exact_indexes.get(wanted)
+        if idx is not None:
+            return idx
         
         # Find index that starts with these columns
-        for idx in indexes:
-            idx_cols = idx['columns']
-            if len(columns) <= len(idx_cols):
-                if all(columns[i] == idx_cols[i] for i in range(len(columns))):
-                    return idx
+        node = lookup.index_trie
+        for col in columns:
+            node = node[1].get(col)
+            if node is None:
+                break
+        else:
+            if node[0] is not None:
+                return node[0]
         
         # Find index that contains these columns
-        for idx in indexes:
-            if all(col in idx['columns'] for col in columns):
+        for idx_set, idx in lookup.index_sets:
+            if wanted <= idx_set:
                 return idx
         
         return None
     
     def get_join_info(self, table1: str, table2: str) -> Optional[Dict]:
         """Get join relationship between two tables"""
-        info1 = self.get_table_info(table1)
-        info2 = self.get_table_info(table2)
+        name1 = self._resolve(table1)
+        name2 = self._resolve(table2)
         
-        if not info1 or not info2:
+        if not name1 or not name2:
             return None
+        info1 = self.metadata[name1]
         
-        # Check foreign keys
-        for fk in info1.get('foreign_keys', []):
-            if table2 in fk['references']:
-                return {
-                    'type': 'foreign_key',
-                    'from_column': fk['column'],
-                    'to_table': table2,
-                    'to_column': fk['references'].split('.')[-1]
-                }
+        # Check foreign keys - exact referenced table first, then any reference containing the name
+        # (e.g. a key into a prefixed or suffixed copy of the table)
+        fk = self._table_lookup(name1).fk_targets.get(table2)
+        if fk is None:
+            fk = next(((fk['column'], fk['references'].split('.')[-1])
+                       for fk in info1.get('foreign_keys', []) if table2 in fk['references']), None)
+        if fk:
+            return {
+                'type': 'foreign_key',
+                'from_column': fk[0],
+                'to_table': table2,
+                'to_column': fk[1]
+            }
         
         # Check common joins from training data
         for join in info1.get('common_joins', []):
@@ -89,10 +170,7 @@ class SchemaKnowledge:
                 return {'type': 'trained', 'join': join}
         
         # Try to infer from column names
-        cols1 = {col['name'] for col in info1['columns']}
-        cols2 = {col['name'] for col in info2['columns']}
-        
-        common_cols = cols1 & cols2
+        common_cols = self._table_lookup(name1).column_names & self._table_lookup(name2).column_names
         if common_cols:
             # Prefer columns with 'id' or 'code'
             for col in common_cols:
@@ -156,47 +234,89 @@ class SchemaKnowledge:
     
     def generate_schema_context(self) -> str:
         """Generate concise schema context for LLM"""
-        context = "KEY TABLE RELATIONSHIPS:\n\n"
-        
-        important_tables = [
-            'customers', 'account_holders', 'loan_od_working_registers',
-            'loan_od_disbursements', 'account_profiles', 'loan_od_profiles'
-        ]
-        
-        for table in important_tables:
-            info = self.get_table_info(table)
-            if info:
-                schema = info['schema']
-                full_name = f"{schema}.{table}"
-                context += f"{full_name}:\n"
-                
-                # Key columns with indexes
-                indexed_cols = set()
-                for idx in info.get('indexes', []):
-                    indexed_cols.update(idx['columns'])
-                
-                key_cols = [col for col in info['columns'] 
-                           if col['key'] or col['name'] in indexed_cols][:10]
-                
-                for col in key_cols:
-                    idx_marker = "🔑" if col['name'] in indexed_cols else ""
-                    context += f"  - {col['name']} {idx_marker}\n"
-                
-                # Foreign keys
-                if info.get('foreign_keys'):
-                    context += "  Foreign Keys:\n"
-                    for fk in info['foreign_keys'][:3]:
-                        context += f"    {fk['column']} → {fk['references']}\n"
-                
-                # Common joins from training
-                if info.get('common_joins'):
-                    context += "  Common Joins:\n"
-                    for join in info['common_joins'][:2]:
-                        context += f"    {join}\n"
-                
-                context += "\n"
-        
-        return context
+        return str(self.schema_context())
+    
+    def schema_context(self) -> 'SchemaContext':
+        """The schema context as a SchemaContext, for rendering only some tables (built once per loaded metadata)"""
+        if self._context_cache is None:
+            self._context_cache = SchemaContext(self, self._context_tables())
+        return self._context_cache
+    
+    def _context_tables(self) -> List[Tuple[str, str]]:
+        """(table, metadata key) of the important tables present in the loaded metadata"""
+        return [(table, self._by_table[table]) for table in IMPORTANT_TABLES if table in self._by_table]
+    
+    def _build_table_context(self, table: str, resolved: str) -> str:
+        """Render one table's section of the schema context"""
+        info = self.metadata[resolved]
+        schema = info['schema']
+        full_name = f"{schema}.{table}"
+        parts = [f"{full_name}:\n"]
+        
+        # Key columns with indexes
+        indexed_cols = self._table_lookup(resolved).indexed_columns
+        
+        key_cols = [col for col in info['columns'] 
+                   if col['key'] or col['name'] in indexed_cols][:10]
+        
+        for col in key_cols:
+            idx_marker = "🔑" if col['name'] in indexed_cols else ""
+            parts.append(f"  - {col['name']} {idx_marker}\n")
+        
+        # Foreign keys
+        if info.get('foreign_keys'):
+            parts.append("  Foreign Keys:\n")
+            for fk in info['foreign_keys'][:3]:
+                parts.append(f"    {fk['column']} → {fk['references']}\n")
+        
+        # Common joins from training
+        if info.get('common_joins'):
+            parts.append("  Common Joins:\n")
+            for join in info['common_joins'][:2]:
+                parts.append(f"    {join}\n")
+        
+        parts.append("\n")
+        return ''.join(parts)
+
+
+class SchemaContext:
+    """
+    Schema context for the LLM prompt, rendered on demand.
+    str() gives the whole text; render(tables) only the sections of the given tables
+    (bare or schema-qualified names), so each section is built the first time it is needed.
+    """
+    
+    __slots__ = ('_knowledge', '_tables', '_sections', '_text')
+    
+    HEADER = "KEY TABLE RELATIONSHIPS:\n\n"
+    
+    def __init__(self, knowledge: SchemaKnowledge, tables: List[Tuple[str, str]]):
+        self._knowledge = knowledge
+        self._tables = tables
+        self._sections: Dict[str, str] = {}
+        self._text: Optional[str] = None
+    
+    def _section(self, table: str, resolved: str) -> str:
+        section = self._sections.get(resolved)
+        if section is None:
+            section = self._sections[resolved] = self._knowledge._build_table_context(table, resolved)
+        return section
+    
+    def render(self, tables: Optional[List[str]] = None) -> str:
+        """Context text for the given tables, or for all of them"""
+        if tables is None:
+            return str(self)
+        wanted = set(tables)
+        parts = [self.HEADER]
+        for table, resolved in self._tables:
+            if table in wanted or resolved in wanted:
+                parts.append(self._section(table, resolved))
+        return ''.join(parts)
+    
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = self.HEADER + ''.join(self._section(table, resolved) for table, resolved in self._tables)
+        return self._text
 
 
 # Global instance
@@ -3,66 +3,100 @@ Sync SCHEMA_TRAINING_FILTERED.txt to schema_metadata_filtered.json
 Reads the filled training data and updates the JSON file
 """
 
-import json
 import re
+import orjson
+
+# Field headers of the fill-in section, e.g. "DESCRIPTION (what data does this table hold?):"
+HEADER_RE = re.compile(r'^(DESCRIPTION|BUSINESS MEANING|COMMON JOINS)')
+TABLE_RE = re.compile(r'TABLE:\s+(\S+)')
+
+
+def parse_fill_section(fill_section):
+    """
+    Read the fill-in fields in one pass over the lines.
+    DESCRIPTION / BUSINESS MEANING are the text block under their header (up to the next blank line),
+    COMMON JOINS are the JOIN lines under its header.
+    """
+    lines = {'DESCRIPTION': [], 'BUSINESS MEANING': [], 'COMMON JOINS': []}
+    current = None
+    for line in fill_section.splitlines():
+        header = HEADER_RE.match(line)
+        if header:
+            current = header.group(1)
+            continue
+        if current is None:
+            continue
+        
+        field = lines[current]
+        if current == 'COMMON JOINS':
+            if not line:
+                current = None
+                continue
+            line = line.strip()
+            if line.startswith('JOIN') and 'Example:' not in line:
+                field.append(line)
+        elif field:
+            if not line:
+                current = None
+                continue
+            field.append(line)
+        elif line.strip():
+            # Blank lines between the header and the text are skipped
+            field.append(line)
+    
+    return {
+        'DESCRIPTION': '\n'.join(lines['DESCRIPTION']).strip(),
+        'BUSINESS MEANING': '\n'.join(lines['BUSINESS MEANING']).strip(),
+        'COMMON JOINS': lines['COMMON JOINS'],
+    }
+
+
+def iter_sections(f, sep='='*100):
+    """Yield the text between separator lines of an open training file, one section at a time"""
+    buf = []
+    for line in f:
+        if line.startswith(sep):
+            if buf:
+                yield ''.join(buf)
+                buf = []
+        else:
+            buf.append(line)
+    if buf:
+        yield ''.join(buf)
+
 
 def parse_training_file(filename='SCHEMA_TRAINING_FILTERED.txt'):
     """Parse the training file and extract filled information"""
     
-    with open(filename, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Split by table sections
     tables = {}
-    table_sections = content.split('='*100)
+    table_name = None
     
-    for section in table_sections:
-        if not section.strip() or 'TABLE:' not in section:
-            continue
-        
-        # Extract table name
-        table_match = re.search(r'TABLE:\s+(\S+)', section)
-        if not table_match:
-            continue
-        
-        table_name = table_match.group(1)
-        
-        # Extract the filled sections
-        description = ""
-        business_meaning = ""
-        common_joins = []
-        
-        # Look for filled content after "FILL IN BELOW"
-        if 'FILL IN BELOW' in section:
-            fill_section = section.split('FILL IN BELOW')[1]
+    with open(filename, 'r', encoding='utf-8') as f:
+        for section in iter_sections(f):
+            # The table header sits between two separators; its fill-in section follows
+            # (in the same section for files written without the second separator)
+            table_match = TABLE_RE.search(section) if 'TABLE:' in section else None
+            if table_match:
+                table_name = table_match.group(1)
             
-            # Extract DESCRIPTION
-            desc_match = re.search(r'DESCRIPTION.*?:\s*\n\s*(.*?)\n\n', fill_section, re.DOTALL)
-            if desc_match:
-                description = desc_match.group(1).strip()
+            # Look for filled content after "FILL IN BELOW"
+            if table_name is None or 'FILL IN BELOW' not in section:
+                continue
             
-            # Extract BUSINESS MEANING
-            bm_match = re.search(r'BUSINESS MEANING.*?:\s*\n\s*(.*?)\n\n', fill_section, re.DOTALL)
-            if bm_match:
-                business_meaning = bm_match.group(1).strip()
+            fill_section = section.split('FILL IN BELOW')[1]
+            fields = parse_fill_section(fill_section)
+            description = fields['DESCRIPTION']
+            business_meaning = fields['BUSINESS MEANING']
+            common_joins = fields['COMMON JOINS']
             
-            # Extract COMMON JOINS
-            joins_match = re.search(r'COMMON JOINS.*?:\s*\n(.*?)(?:\n\n|$)', fill_section, re.DOTALL)
-            if joins_match:
-                joins_text = joins_match.group(1)
-                # Parse each line that starts with JOIN
-                for line in joins_text.split('\n'):
-                    line = line.strip()
-                    if line and line.startswith('JOIN') and 'Example:' not in line:
-                        common_joins.append(line)
-        
-        # Only add if something was filled
-        if description or business_meaning or common_joins:
-            tables[table_name] = {
-                'description': description,
-                'business_meaning': business_meaning,
-                'common_joins': common_joins
-            }
+            # Only add if something was filled
+            if description or business_meaning or common_joins:
+                tables[table_name] = {
+                    'description': description,
+                    'business_meaning': business_meaning,
+                    'common_joins': common_joins
+                }
+            table_name = None
     
     return tables
 
@@ -71,24 +105,23 @@ def update_json_metadata(training_data, json_file='schema_metadata_filtered.json
     """Update the JSON metadata with training data"""
     
     # Read existing JSON
-    with open(json_file, 'r', encoding='utf-8') as f:
-        metadata = json.load(f)
+    with open(json_file, 'rb') as f:
+        metadata = orjson.loads(f.read())
     
     # Update tables with training data
     updated_count = 0
     for table_name, training in training_data.items():
-        if table_name in metadata:
-            metadata[table_name]['description'] = training['description']
-            metadata[table_name]['business_meaning'] = training['business_meaning']
-            metadata[table_name]['common_joins'] = training['common_joins']
+        table = metadata.get(table_name)
+        if table is not None:
+            table.update(training)
             updated_count += 1
             print(f"✓ Updated: {table_name}")
         else:
             print(f"✗ Not found: {table_name}")
     
     # Save updated JSON
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    with open(json_file, 'wb') as f:
+        f.write(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
     
     return updated_count
 
@@ -3,34 +3,117 @@ Interactive Schema Training Tool
 Makes it easy to train the AI on your database schema
 """
 
-import json
 import os
+import queue
+import threading
+import orjson
 from collections import defaultdict
+from itertools import islice
+
+# Full rewrite of the metadata file (in the background) every N trained tables; each table is also appended to the journal
+SAVE_EVERY = 10
+
+# Priority bonus for tables whose name contains all of the words
+NAME_BONUSES = (
+    (('customer',), 15),
+    (('loan', 'account'), 12),
+    (('disbursement',), 10),
+    (('product',), 8),
+    (('account', 'profile'), 10),
+    (('account_holder',), 12),
+)
+
+
+def journal_path(filename):
+    """Side-car file holding the tables trained since the metadata file was last written"""
+    return os.path.splitext(filename)[0] + '.delta.jsonl'
 
 def load_metadata(filename='schema_metadata_filtered.json'):
-    """Load the schema metadata"""
-    with open(filename, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load the schema metadata, including training journaled since the last save"""
+    with open(filename, 'rb') as f:
+        metadata = orjson.loads(f.read())
+    
+    try:
+        with open(journal_path(filename), 'rb') as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # Line cut short by a crash mid-write
+                info = metadata.get(entry.pop('table'))
+                if info is not None:
+                    info.update(entry)
+    except FileNotFoundError:
+        pass
+    
+    return metadata
+
+def record_training(journal, table_name, info):
+    """Append one trained table to the journal (O(1), instead of rewriting the whole metadata file)"""
+    journal.write(orjson.dumps({
+        'table': table_name,
+        'description': info['description'],
+        'business_meaning': info['business_meaning'],
+        'common_joins': info['common_joins']
+    }) + b'\n')
+    journal.flush()
+
+def encode_metadata(metadata):
+    """Serialize the metadata file contents"""
+    return orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
+
+def write_metadata(data, filename='schema_metadata_filtered.json'):
+    """Write encoded metadata atomically (a crash mid-write leaves the previous file in place)"""
+    tmp_path = f"{filename}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, filename)
 
 def save_metadata(metadata, filename='schema_metadata_filtered.json'):
-    """Save the updated metadata"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    """Save the updated metadata and empty the journal it now contains"""
+    write_metadata(encode_metadata(metadata), filename)
+    if os.path.exists(journal_path(filename)):
+        open(journal_path(filename), 'wb').close()
     print(f"\n✓ Saved to {filename}")
 
+def metadata_writer(snapshots, filename='schema_metadata_filtered.json'):
+    """
+    Background thread: write each encoded metadata snapshot put on the queue until None arrives, so the
+    trainer never waits on a full rewrite. The journal is left alone - entries made while a snapshot
+    is written are not in it, and replaying the rest is harmless.
+    """
+    while True:
+        snapshot = snapshots.get()
+        if snapshot is None:
+            return
+        try:
+            write_metadata(snapshot, filename)
+        except Exception as e:
+            print(f"\n❌ Background save failed (training is kept in the journal): {e}")
+
 def get_priority_tables(metadata):
-    """Get tables that should be trained first based on importance"""
-    scored_tables = []
+    """
+    Split tables into (untrained, trained) in one pass.
+    untrained holds (name, info, score) for tables worth training, most important first; trained holds (name, info).
+    """
+    untrained = []
+    trained = []
     
     for table_name, info in metadata.items():
+        # Already trained tables are not scored
+        if info.get('description') and info.get('business_meaning'):
+            trained.append((table_name, info))
+            continue
+        
         score = 0
+        row_count = info['row_count']
         
         # Score by row count (more rows = more important)
-        if info['row_count'] > 100000:
+        if row_count > 100000:
             score += 10
-        elif info['row_count'] > 10000:
+        elif row_count > 10000:
             score += 5
-        elif info['row_count'] > 1000:
+        elif row_count > 1000:
             score += 2
         
         # Score by foreign keys (more relationships = more important)
@@ -41,110 +124,122 @@ def get_priority_tables(metadata):
         
         # Bonus for common table names
         table_lower = table_name.lower()
-        if 'customer' in table_lower:
-            score += 15
-        if 'loan' in table_lower and 'account' in table_lower:
-            score += 12
-        if 'disbursement' in table_lower:
-            score += 10
-        if 'product' in table_lower:
-            score += 8
-        if 'account' in table_lower and 'profile' in table_lower:
-            score += 10
-        if 'account_holder' in table_lower:
-            score += 12
-        
-        # Skip if already trained
-        if info.get('description') and info.get('business_meaning'):
-            score = -1  # Already trained
+        for words, bonus in NAME_BONUSES:
+            if all(word in table_lower for word in words):
+                score += bonus
         
-        scored_tables.append((table_name, info, score))
+        # Tables with nothing pointing to their importance are not offered
+        if score > 0:
+            untrained.append((table_name, info, score))
     
     # Sort by score
-    scored_tables.sort(key=lambda x: x[2], reverse=True)
+    untrained.sort(key=lambda x: x[2], reverse=True)
     
-    return scored_tables
+    return untrained, trained
+
+def is_key_column_name(name):
+    """Column names shown as key columns even without a key"""
+    name_lower = name.lower()
+    return 'id' in name_lower or 'code' in name_lower
 
 def show_table_info(table_name, info):
-    """Display table information"""
-    print("\n" + "="*80)
-    print(f"TABLE: {table_name}")
-    print("="*80)
-    print(f"Schema: {info['schema']}")
-    print(f"Row Count: {info['row_count']:,}")
+    """Display table information (assembled first and printed in one write)"""
+    lines = [
+        "\n" + "="*80,
+        f"TABLE: {table_name}",
+        "="*80,
+        f"Schema: {info['schema']}",
+        f"Row Count: {info['row_count']:,}"
+    ]
     
     # Show key columns
-    print("\nKEY COLUMNS:")
-    key_cols = [col for col in info['columns'] if col['key'] or 'id' in col['name'].lower() or 'code' in col['name'].lower()][:8]
+    lines.append("\nKEY COLUMNS:")
+    # Stops at the 8th key column instead of filtering every column of a wide table
+    key_cols = islice((col for col in info['columns'] if col['key'] or is_key_column_name(col['name'])), 8)
     for col in key_cols:
         key_marker = f"[{col['key']}]" if col['key'] else ""
-        print(f"  - {col['name']} ({col['type']}) {key_marker}")
+        lines.append(f"  - {col['name']} ({col['type']}) {key_marker}")
     
     # Show indexes
-    print("\nINDEXES:")
+    lines.append("\nINDEXES:")
     for idx in info['indexes'][:5]:
         unique = "UNIQUE" if idx['unique'] else ""
         cols = ', '.join(idx['columns'][:3])
         if len(idx['columns']) > 3:
             cols += '...'
-        print(f"  - {idx['name']} {unique} on ({cols})")
+        lines.append(f"  - {idx['name']} {unique} on ({cols})")
     
     # Show foreign keys
     if info.get('foreign_keys'):
-        print("\nFOREIGN KEYS:")
+        lines.append("\nFOREIGN KEYS:")
         for fk in info['foreign_keys'][:5]:
-            print(f"  - {fk['column']} -> {fk['references']}")
+            lines.append(f"  - {fk['column']} -> {fk['references']}")
+    
+    print("\n".join(lines))
+
+def is_join_column(col):
+    """Columns suggest_joins proposes joining on"""
+    col_lower = col.lower()
+    return ('id' in col_lower or 'code' in col_lower) and col not in ['id', 'version']
+
+def build_column_index(metadata):
+    """Join column name -> [(position, table name)] in metadata order, built once per session for suggest_joins"""
+    column_index = defaultdict(list)
+    for position, (table_name, info) in enumerate(metadata.items()):
+        for col in {col['name'] for col in info['columns']}:
+            if is_join_column(col):
+                column_index[col].append((position, table_name))
+    return column_index
 
-def suggest_joins(table_name, info, all_metadata):
+def suggest_joins(table_name, info, column_index):
     """Auto-suggest common joins based on column names and foreign keys"""
     suggestions = []
+    # Tables already joined through a foreign key - a shared column adds nothing there
+    fk_targets = set()
     
     # From foreign keys
     for fk in info.get('foreign_keys', []):
         ref_parts = fk['references'].split('.')
         if len(ref_parts) == 3:
             ref_schema, ref_table, ref_col = ref_parts
+            fk_targets.add(f"{ref_schema}.{ref_table}")
             suggestions.append(
                 f"JOIN {ref_schema}.{ref_table} ON {table_name}.{fk['column']} = {ref_schema}.{ref_table}.{ref_col}"
             )
     
-    # Common patterns based on column names
-    table_parts = table_name.split('.')
-    if len(table_parts) == 2:
-        schema, table = table_parts
-        
-        # Look for matching columns in other tables
-        my_cols = {col['name'] for col in info['columns']}
+    # Column-name patterns only for schema.table names, and only while there is room for more
+    if len(suggestions) >= 5 or len(table_name.split('.')) != 2:
+        return suggestions[:5]
+    
+    # Other tables sharing a join column, found through the index instead of scanning every table
+    shared = defaultdict(set)
+    for col in {col['name'] for col in info['columns']}:
+        for other in column_index.get(col, ()):
+            if other[1] != table_name and other[1] not in fk_targets:
+                shared[other].add(col)
+    
+    for other in sorted(shared):
+        other_name = other[1]
+        common = shared[other]
         
-        for other_name, other_info in all_metadata.items():
-            if other_name == table_name:
-                continue
-            
-            # Check for common join columns
-            other_cols = {col['name'] for col in other_info['columns']}
-            common = my_cols & other_cols
-            
-            # Suggest joins on common columns with 'id' or 'code'
-            for col in common:
-                if ('id' in col.lower() or 'code' in col.lower()) and col not in ['id', 'version']:
-                    # Check if it's a composite key pattern (tenant_code + account_id)
-                    if 'tenant_code' in common and 'account_id' in common and col == 'tenant_code':
-                        suggestions.append(
-                            f"JOIN {other_name} ON {table_name}.tenant_code = {other_name}.tenant_code AND {table_name}.account_id = {other_name}.account_id"
-                        )
-                        break
-                    else:
-                        suggestions.append(f"JOIN {other_name} ON {table_name}.{col} = {other_name}.{col}")
-                    
-                    if len(suggestions) >= 5:
-                        break
-            
-            if len(suggestions) >= 5:
+        # Suggest joins on the common 'id'/'code' columns
+        for col in common:
+            # Check if it's a composite key pattern (tenant_code + account_id)
+            if 'tenant_code' in common and 'account_id' in common and col == 'tenant_code':
+                suggestions.append(
+                    f"JOIN {other_name} ON {table_name}.tenant_code = {other_name}.tenant_code AND {table_name}.account_id = {other_name}.account_id"
+                )
                 break
+            suggestions.append(f"JOIN {other_name} ON {table_name}.{col} = {other_name}.{col}")
+            if len(suggestions) >= 5:
+                return suggestions
+        
+        if len(suggestions) >= 5:
+            return suggestions
     
-    return suggestions[:5]  # Return top 5
+    return suggestions
 
-def train_table(table_name, info, all_metadata):
+def train_table(table_name, info, column_index):
     """Interactive training for a single table"""
     
     show_table_info(table_name, info)
@@ -169,7 +264,7 @@ def train_table(table_name, info, all_metadata):
     # Get joins
     print("\n3️⃣  COMMON JOINS (how does it join with other tables?)")
     print("\n   📋 Suggested joins based on your schema:")
-    suggestions = suggest_joins(table_name, info, all_metadata)
+    suggestions = suggest_joins(table_name, info, column_index)
     
     if suggestions:
         for i, suggestion in enumerate(suggestions, 1):
@@ -180,10 +275,11 @@ def train_table(table_name, info, all_metadata):
         
         common_joins = []
         if choice.lower() != 'n':
-            try:
-                indices = [int(x.strip()) - 1 for x in choice.split(',') if x.strip()]
+            parts = [x.strip() for x in choice.split(',') if x.strip()]
+            if all(part.isdecimal() for part in parts):
+                indices = [int(part) - 1 for part in parts]
                 common_joins = [suggestions[i] for i in indices if 0 <= i < len(suggestions)]
-            except:
+            else:
                 print("   Invalid input, skipping joins")
         
         # Option to add custom joins
@@ -206,70 +302,84 @@ def train_table(table_name, info, all_metadata):
 
 def main():
     """Main interactive training loop"""
-    print("="*80)
-    print("🎓 INTERACTIVE SCHEMA TRAINING TOOL")
-    print("="*80)
-    print("\nThis tool will help you train the AI on your database schema.")
-    print("We'll focus on the most important tables first.\n")
+    print("\n".join([
+        "="*80,
+        "🎓 INTERACTIVE SCHEMA TRAINING TOOL",
+        "="*80,
+        "\nThis tool will help you train the AI on your database schema.",
+        "We'll focus on the most important tables first.\n"
+    ]))
     
     # Load metadata
     metadata = load_metadata()
     
-    # Get priority tables
-    priority_tables = get_priority_tables(metadata)
+    # Get priority tables (already trained ones split off)
+    untrained, trained = get_priority_tables(metadata)
     
-    # Filter out already trained
-    untrained = [(name, info, score) for name, info, score in priority_tables if score > 0]
-    trained = [(name, info, score) for name, info, score in priority_tables if score < 0]
-    
-    print(f"📊 Status:")
-    print(f"   - Already trained: {len(trained)} tables")
-    print(f"   - Ready to train: {len(untrained)} tables")
-    print(f"   - Total tables: {len(metadata)}")
+    lines = [
+        "📊 Status:",
+        f"   - Already trained: {len(trained)} tables",
+        f"   - Ready to train: {len(untrained)} tables",
+        f"   - Total tables: {len(metadata)}"
+    ]
     
     if len(trained) > 0:
-        print(f"\n✓ Previously trained tables:")
-        for name, _, _ in trained[:5]:
-            print(f"   - {name}")
+        lines.append("\n✓ Previously trained tables:")
+        lines.extend(f"   - {name}" for name, _ in trained[:5])
         if len(trained) > 5:
-            print(f"   ... and {len(trained) - 5} more")
+            lines.append(f"   ... and {len(trained) - 5} more")
+    print("\n".join(lines))
     
     if len(untrained) == 0:
         print("\n🎉 All important tables are already trained!")
         return
     
-    print(f"\n📚 Top {min(20, len(untrained))} tables to train (by importance):")
+    lines = [f"\n📚 Top {min(20, len(untrained))} tables to train (by importance):"]
     for i, (name, info, score) in enumerate(untrained[:20], 1):
         rows = f"{info['row_count']:,}" if info['row_count'] > 0 else "empty"
-        print(f"   {i}. {name} ({rows} rows)")
-    
-    print("\n" + "-"*80)
+        lines.append(f"   {i}. {name} ({rows} rows)")
+    lines.append("\n" + "-"*80)
+    print("\n".join(lines))
     input("Press Enter to start training...")
     
     # Training loop
+    column_index = build_column_index(metadata)
     trained_count = 0
-    for name, info, score in untrained[:20]:
-        print("\n\n")
-        try:
-            if train_table(name, info, metadata):
-                trained_count += 1
-                
-                # Save after each table
-                save_metadata(metadata)
-                
-                # Ask to continue
-                print(f"\n📈 Progress: {trained_count} tables trained")
-                cont = input("\nContinue to next table? (y/n, default=y): ").strip().lower()
+    snapshots = queue.Queue()
+    writer = threading.Thread(target=metadata_writer, args=(snapshots,), name="metadata-writer", daemon=True)
+    writer.start()
+    with open(journal_path('schema_metadata_filtered.json'), 'ab') as journal:
+        for name, info, score in untrained[:20]:
+            print("\n\n")
+            try:
+                if train_table(name, info, column_index):
+                    trained_count += 1
+                    
+                    # Journal after each table, rewrite the full file every SAVE_EVERY tables
+                    record_training(journal, name, info)
+                    if trained_count % SAVE_EVERY == 0:
+                        # Encoded here - the writer must not read dicts the next table's training changes
+                        snapshots.put(encode_metadata(metadata))
+                    
+                    # Ask to continue
+                    print(f"\n📈 Progress: {trained_count} tables trained")
+                    cont = input("\nContinue to next table? (y/n, default=y): ").strip().lower()
+                    if cont == 'n':
+                        break
+            except KeyboardInterrupt:
+                print("\n\n⚠️  Training interrupted")
+                break
+            except Exception as e:
+                print(f"\n❌ Error: {e}")
+                cont = input("Continue anyway? (y/n): ").strip().lower()
                 if cont == 'n':
                     break
-        except KeyboardInterrupt:
-            print("\n\n⚠️  Training interrupted")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {e}")
-            cont = input("Continue anyway? (y/n): ").strip().lower()
-            if cont == 'n':
-                break
+    
+    # Let pending background writes finish, then write the final state and clear the journal
+    snapshots.put(None)
+    writer.join()
+    if trained_count:
+        save_metadata(metadata)
     
     # Final summary
     print("\n" + "="*80)